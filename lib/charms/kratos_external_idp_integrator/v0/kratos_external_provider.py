@@ -101,11 +101,10 @@ class KratosCharm(CharmBase):
 
 import base64
 import hashlib
-import inspect
 import json
 import logging
-from dataclasses import dataclass
-from typing import Dict, List, Mapping, Optional, Type
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type
 
 import jsonschema
 from ops.charm import (
@@ -127,7 +126,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 13
+LIBPATCH = 15
 
 PYDEPS = ["jsonschema"]
 
@@ -246,13 +245,28 @@ def _dump_data(data: Dict, schema: Dict) -> Dict:
     return data
 
 
+# id of the schema -> (schema, validator), the schema is kept to detect reused ids
+_VALIDATORS: Dict[int, Tuple[Dict, Any]] = {}
+
+
+def _get_validator(schema: Dict) -> Any:
+    """Get the validator of `schema`, building it and checking the schema on first use."""
+    entry = _VALIDATORS.get(id(schema))
+    if entry is None or entry[0] is not schema:
+        validator_cls = jsonschema.validators.validator_for(schema)
+        validator_cls.check_schema(schema)
+        entry = _VALIDATORS[id(schema)] = (schema, validator_cls(schema))
+
+    return entry[1]
+
+
 def _validate_data(data: Dict, schema: Dict) -> None:
     """Checks whether `data` matches `schema`.
 
     Will raise DataValidationError if the data is not valid, else return None.
     """
     try:
-        jsonschema.validate(instance=data, schema=schema)
+        _get_validator(schema).validate(data)
     except jsonschema.ValidationError as e:
         raise DataValidationError(data, schema) from e
 
@@ -587,7 +601,7 @@ class ExternalIdpProvider(Object):
                 raise ValueError(f"Invalid backend: {backend}")
 
 
-@dataclass
+@dataclass(slots=True)
 class Provider:
     """Class for describing an external provider."""
 
@@ -605,20 +619,24 @@ class Provider:
     private_key: Optional[str] = None
     jsonnet_mapper: Optional[str] = None
     id: Optional[str] = None
+    _default_id: str = field(init=False, repr=False, compare=False)
 
-    @property
-    def provider_id(self) -> str:
-        """A unique ID for the client credentials of the provider."""
-        if self.id:
-            return self.id
-
+    def __post_init__(self) -> None:
         if self.issuer_url:
             id = hashlib.sha1(f"{self.client_id}_{self.issuer_url}".encode()).hexdigest()
         elif self.get_microsoft_tenant():
             id = hashlib.sha1(f"{self.client_id}_{self.tenant_id}".encode()).hexdigest()
         else:
             id = hashlib.sha1(self.client_id.encode()).hexdigest()
-        return f"{self.provider}_{id}"
+        self._default_id = f"{self.provider}_{id}"
+
+    @property
+    def provider_id(self) -> str:
+        """A unique ID for the client credentials of the provider.
+
+        The ID derived from the credentials is computed once, at construction.
+        """
+        return self.id or self._default_id
 
     @provider_id.setter
     def provider_id(self, val) -> None:
@@ -662,7 +680,11 @@ class Provider:
         """Generate Provider instance from dict."""
         if provider_id := dic.get("provider_id"):
             dic["id"] = provider_id
-        return cls(**{k: v for k, v in dic.items() if k in inspect.signature(cls).parameters})
+        return cls(**{k: v for k, v in dic.items() if k in _PROVIDER_FIELDS})
+
+
+# The fields accepted by the constructor of `Provider`
+_PROVIDER_FIELDS = frozenset(f.name for f in fields(Provider) if f.init)
 
 
 class ClientConfigChangedEvent(EventBase):
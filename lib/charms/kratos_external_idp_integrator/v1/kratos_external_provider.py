@@ -42,6 +42,7 @@ class SomeCharm(CharmBase):
 
     self.framework.observe(self.on.config_changed, self._on_config_changed)
     self.framework.observe(self.external_idp_provider.on.ready, self._on_ready)
+    self.framework.observe(self.external_idp_provider.on.features_changed, self._on_ready)
     self.framework.observe(
         self.external_idp_provider.on.redirect_uri_changed, self._on_redirect_uri_changed
     )
@@ -94,27 +95,70 @@ class KratosCharm(CharmBase):
             event.relation_id,
         )
 ```
+
+To reconfigure Kratos only once per dispatch, instead of once per relation event,
+pass a callback that receives all the provider changes of the dispatch:
+
+```python
+    self.external_idp_requirer = ExternalIdpRequirer(
+        self, on_providers_changed=self._on_providers_changed
+    )
+
+    def _on_providers_changed(self, changeset: ProvidersChangeset) -> bool:
+        if not self._container.can_connect():
+            # The changes are delivered again, with any new ones, in the next dispatch
+            return False
+
+        self._configure()
+        return True
+```
 """
 
 import base64
 import hashlib
 import json
 import logging
-from typing import Annotated, Iterator, Literal, Mapping, Optional, Union
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import (
+    Annotated,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Union,
+    get_args,
+)
 
 from ops.charm import (
     CharmBase,
     RelationBrokenEvent,
     RelationChangedEvent,
+    RelationCreatedEvent,
     RelationDepartedEvent,
     RelationEvent,
     RelationJoinedEvent,
+    SecretChangedEvent,
+    UpgradeCharmEvent,
+)
+from ops.framework import EventBase, EventSource, Handle, Object, ObjectEvents, StoredState
+from ops.model import (
+    Model,
+    ModelError,
+    Relation,
+    SecretNotFoundError,
+    TooManyRelatedAppsError,
 )
-from ops.framework import EventBase, EventSource, Handle, Object, ObjectEvents
-from ops.model import Relation, TooManyRelatedAppsError
 from pydantic import (
     AliasChoices,
     BaseModel,
+    ConfigDict,
     Field,
     RootModel,
     SecretStr,
@@ -135,13 +179,23 @@ LIBAPI = 1
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 0
+LIBPATCH = 31
 
 PYDEPS = ["pydantic~=2.11"]
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_RELATION_NAME = "kratos-external-idp"
+DEFAULT_PREFETCH_WORKERS = 8
+# The wire format features that the requirer advertises in its `features` key
+COMPACT_MAPPERS = "compact-mappers"
+ZLIB_ENCODING = "zlib"
+JUJU_SECRETS = "juju-secrets"
+SUPPORTED_FEATURES = (COMPACT_MAPPERS, ZLIB_ENCODING, JUJU_SECRETS)
+# The encoding of the compressed payloads, and the payload size from which they are compressed
+ZLIB_BASE64 = "zlib+base64"
+COMPRESSION_THRESHOLD = 1024
+_FEATURES_JSON = json.dumps(SUPPORTED_FEATURES)
 ALLOWED_PROVIDERS = {
     "generic",
     "google",
@@ -162,6 +216,49 @@ ALLOWED_PROVIDERS = {
 }
 
 
+def _digest(data: str) -> str:
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _canonical_json(model: BaseModel) -> str:
+    """Serialize a model to json with sorted keys, so equal models give equal strings."""
+    return json.dumps(model.model_dump(mode="json", by_alias=True), sort_keys=True)
+
+
+def _update_databag(databag: MutableMapping[str, str], data: Mapping[str, str]) -> bool:
+    """Write only the keys whose value changed, to avoid needless `relation-set` calls.
+
+    An empty value removes the key from the databag.
+
+    Returns:
+        Whether the databag was written to.
+    """
+    if not (
+        changed := {key: value for key, value in data.items() if databag.get(key, "") != value}
+    ):
+        return False
+
+    databag.update(changed)
+    return True
+
+
+def _mapper_url(jsonnet_mapper: str) -> str:
+    return f"base64://{base64.b64encode(jsonnet_mapper.encode()).decode()}"
+
+
+def _parse_features(data: Mapping[str, str]) -> frozenset[str]:
+    """Get the wire format features that the other side of the relation advertises."""
+    try:
+        features = json.loads(data.get("features") or "[]")
+    except json.JSONDecodeError:
+        return frozenset()
+
+    if not isinstance(features, list):
+        return frozenset()
+
+    return frozenset(feature for feature in features if isinstance(feature, str))
+
+
 def dump_secret(v: SecretStr, _: SerializerFunctionWrapHandler) -> str:
     return v.get_secret_value()
 
@@ -170,6 +267,8 @@ Secret = Annotated[SecretStr, WrapSerializer(dump_secret)]
 
 
 class BaseProvider(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     provider: str
     client_id: str
     scope: list[str] = ["profile", "email", "address", "phone"]
@@ -181,6 +280,7 @@ class BaseProvider(BaseModel):
     label: Optional[str] = Field(default=None)
     jsonnet_mapper: Optional[str] = Field(default=None)
     mapper_url: Optional[str] = Field(default=None)
+    secret_backend: Literal["relation", "secret"] = Field(default="relation", exclude=True)
     relation_id: Optional[int] = Field(default=None, exclude=True)
 
     @field_validator("provider", mode="after")
@@ -204,7 +304,7 @@ class BaseProvider(BaseModel):
     @model_validator(mode="after")
     def deserialize_mapper_url(self) -> Self:
         if self.mapper_url is None and self.jsonnet_mapper is not None:
-            self.mapper_url = f"base64://{base64.b64encode(self.jsonnet_mapper.encode()).decode()}"
+            self.mapper_url = _mapper_url(self.jsonnet_mapper)
 
         return self
 
@@ -302,8 +402,57 @@ Provider = Annotated[
     Field(discriminator="provider"),
 ]
 
+_PROVIDER_TYPES: dict[str, type[BaseProvider]] = {
+    provider: provider_type
+    for provider_type in (
+        GenericProvider,
+        SocialProvider,
+        GithubProvider,
+        MicrosoftProvider,
+        AppleProvider,
+    )
+    for provider in get_args(provider_type.model_fields["provider"].annotation)
+}
+
+
+def _secret_fields(provider: Provider) -> list[str]:
+    return [
+        name for name, info in type(provider).model_fields.items() if info.annotation is SecretStr
+    ]
+
+
+def _secret_content(provider: Provider) -> dict[str, str]:
+    """Get the credentials of the provider, as the content of a Juju secret."""
+    return {
+        name.replace("_", "-"): getattr(provider, name).get_secret_value()
+        for name in _secret_fields(provider)
+    }
+
+
+def construct_provider(data: Mapping[str, Any], relation_id: Optional[int] = None) -> Provider:
+    """Rebuild a provider from the `model_dump()` of an already validated provider.
+
+    This is meant for providers that were validated in a previous dispatch and stored, e.g.
+    in the unit's state. The validators are not run, so this must only be used with trusted
+    data.
+
+    Args:
+        data: The `model_dump()` of the provider, which may also set `secret_backend`.
+        relation_id: The relation that the provider was received from, if any.
+    """
+    provider_type = _PROVIDER_TYPES[data["provider"]]
+    fields = {
+        name: SecretStr(value)
+        if value is not None and provider_type.model_fields[name].annotation is SecretStr
+        else value
+        for name, value in data.items()
+    }
+    return provider_type.model_construct(**fields, relation_id=relation_id)  # type: ignore[return-value]
+
 
 class Providers(RootModel[list[Provider]]):
+    model_config = ConfigDict(defer_build=True)
+
     def __iter__(self) -> Iterator[Provider]:
         yield from self.root
 
@@ -314,12 +463,230 @@ class Providers(RootModel[list[Provider]]):
         return len(self.root)
 
 
+def render_kratos_provider(provider: Provider) -> dict[str, Any]:
+    """Render a provider as an entry of Kratos' `selfservice.methods.oidc.config.providers`."""
+    return provider.model_dump(by_alias=True, exclude_none=True, exclude={"jsonnet_mapper"})
+
+
+def _compress(value: str) -> str:
+    return base64.b64encode(zlib.compress(value.encode(), level=9)).decode()
+
+
+def _decompress(value: str) -> str:
+    try:
+        return zlib.decompress(base64.b64decode(value, validate=True)).decode()
+    except zlib.error as e:
+        raise ValueError(f"Invalid compressed payload: {e}") from e
+
+
+def _encode_providers(
+    providers: Providers,
+    features: frozenset[str],
+    secrets: Optional[Mapping[str, Mapping[str, Any]]] = None,
+) -> dict[str, str]:
+    """Serialize the providers for a relation, in the most compact format it supports.
+
+    With `compact-mappers`, each jsonnet mapper is published once in the `mappers` key,
+    keyed by its digest, and the providers reference it instead of carrying both the
+    mapper and the derived mapper_url.
+
+    With `zlib`, the payloads larger than `COMPRESSION_THRESHOLD` are compressed and
+    base64 encoded, which is recorded in the `encoding` key.
+
+    The credentials of the providers in `secrets` are left out, and the id and revision
+    of their Juju secret are published in the `secrets` key instead.
+    """
+    secrets = secrets or {}
+    entries = providers.model_dump(mode="json", by_alias=True)
+    for provider, entry in zip(providers, entries):
+        if provider.id in secrets:
+            for name in _secret_fields(provider):
+                del entry[name]
+
+    mappers = {}
+    if COMPACT_MAPPERS in features:
+        for entry in entries:
+            if (jsonnet_mapper := entry["jsonnet_mapper"]) is None:
+                continue
+
+            ref = _digest(jsonnet_mapper)
+            mappers[ref] = jsonnet_mapper
+            entry["jsonnet_mapper_ref"] = ref
+            del entry["jsonnet_mapper"]
+            if entry["mapper_url"] == _mapper_url(jsonnet_mapper):
+                # The requirer derives it from the mapper
+                del entry["mapper_url"]
+
+    data = {
+        "providers": json.dumps(entries, sort_keys=True),
+        "mappers": json.dumps(mappers, sort_keys=True) if mappers else "",
+    }
+    if ZLIB_ENCODING in features and sum(map(len, data.values())) >= COMPRESSION_THRESHOLD:
+        data = {key: _compress(value) if value else "" for key, value in data.items()}
+        data["encoding"] = ZLIB_BASE64
+    else:
+        data["encoding"] = ""
+
+    data["secrets"] = json.dumps(secrets, sort_keys=True) if secrets else ""
+    return data
+
+
+_PAYLOAD_KEYS = ("providers", "mappers", "encoding", "secrets")
+
+
+def _payload_digest(data: Mapping[str, str]) -> str:
+    """Get the digest of the providers payload of a databag."""
+    if not any(data.get(key) for key in _PAYLOAD_KEYS[1:]):
+        return _digest(data["providers"])
+
+    return _digest(json.dumps([data.get(key) for key in _PAYLOAD_KEYS]))
+
+
+def _resolve_mapper_reference(entry: dict[str, Any], mappers: Mapping[str, str]) -> None:
+    if (ref := entry.pop("jsonnet_mapper_ref", None)) is None:
+        return
+
+    if not isinstance(ref, str):
+        raise ValueError(f"Invalid jsonnet mapper reference {ref}")
+    if ref not in mappers:
+        raise ValueError(f"Unknown jsonnet mapper reference {ref}")
+    entry["jsonnet_mapper"] = mappers[ref]
+
+
+def _resolve_references(
+    entries: list[Any],
+    mappers: Mapping[str, str],
+    secrets: Mapping[str, Any],
+    read_secret: Optional[Callable[[str, int], dict[str, str]]],
+) -> None:
+    """Replace the jsonnet mapper and Juju secret references with their content."""
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+
+        _resolve_mapper_reference(entry, mappers)
+
+        if (provider_id := entry.get("id")) is None:
+            continue
+        if not isinstance(provider_id, str):
+            raise ValueError(f"Invalid provider id {provider_id}")
+
+        if (secret := secrets.get(provider_id)) is None:
+            continue
+
+        if not isinstance(secret, dict) or not isinstance(secret.get("id"), str):
+            raise ValueError(f"Invalid secret reference {secret}")
+        if not read_secret:
+            raise ValueError(f"Secret {secret['id']} cannot be read")
+
+        content = read_secret(secret["id"], secret.get("revision", 0))
+        entry.update({key.replace("-", "_"): value for key, value in content.items()})
+
+
+# The v0 names of the provider fields that were renamed in v1
+_V0_FIELD_NAMES = {
+    "provider_id": "id",
+    "tenant_id": "microsoft_tenant",
+    "team_id": "apple_team_id",
+    "private_key_id": "apple_private_key_id",
+    "private_key": "apple_private_key",
+}
+
+
+def _is_v0_payload(entries: Any) -> bool:
+    """Check if the providers were published by the v0 library, which always sets `secret_backend`."""
+    return isinstance(entries, list) and any(
+        isinstance(entry, dict) and "secret_backend" in entry for entry in entries
+    )
+
+
+def _upgrade_v0_providers(entries: list[Any]) -> list[Any]:
+    """Rename the fields of providers published by the v0 library to their v1 names.
+
+    The v0 `secret_backend` is dropped, the v0 library only supports inline credentials.
+    """
+    return [
+        {
+            _V0_FIELD_NAMES.get(name, name): value
+            for name, value in entry.items()
+            if name != "secret_backend"
+        }
+        if isinstance(entry, dict)
+        else entry
+        for entry in entries
+    ]
+
+
+def _decode_dual_protocol(providers_json: str) -> Providers:
+    """Parse providers published by either the v0 or the v1 library, parsing the json once."""
+    entries = json.loads(providers_json)
+    if _is_v0_payload(entries):
+        entries = _upgrade_v0_providers(entries)
+
+    return Providers.model_validate(entries)
+
+
+def _decode_providers(
+    data: Mapping[str, str],
+    read_secret: Optional[Callable[[str, int], dict[str, str]]] = None,
+    accept_v0: bool = False,
+) -> Providers:
+    """Parse the providers payload of a databag, in any of the supported formats.
+
+    Args:
+        data: The databag.
+        read_secret: Get the content of a Juju secret by id and revision, needed if
+            the credentials are published in Juju secrets.
+        accept_v0: Whether the providers may have been published by the v0 library.
+
+    Raises:
+        ValueError: If the data is invalid, including a `ValidationError`.
+    """
+    providers_json = data["providers"]
+    mappers_json = data.get("mappers")
+    secrets_json = data.get("secrets")
+    if encoding := data.get("encoding"):
+        if encoding != ZLIB_BASE64:
+            raise ValueError(f"Unsupported encoding {encoding}")
+
+        providers_json = _decompress(providers_json)
+        mappers_json = _decompress(mappers_json) if mappers_json else None
+
+    if not mappers_json and not secrets_json:
+        if accept_v0:
+            return _decode_dual_protocol(providers_json)
+        return Providers.model_validate_json(providers_json)
+
+    entries = json.loads(providers_json)
+    mappers = json.loads(mappers_json) if mappers_json else {}
+    secrets = json.loads(secrets_json) if secrets_json else {}
+    if not isinstance(mappers, dict) or not isinstance(secrets, dict):
+        raise ValueError("Invalid jsonnet mapper or secret references")
+
+    if isinstance(entries, list):
+        _resolve_references(entries, mappers, secrets, read_secret)
+
+    return Providers.model_validate(entries)
+
+
+def _get_secret_content(model: Model, secret_id: str) -> dict[str, str]:
+    try:
+        return model.get_secret(id=secret_id).get_content(refresh=True)
+    except ModelError as e:
+        # e.g. the secret was removed, or it was not granted to this application
+        raise ValueError(f"Secret {secret_id} cannot be read: {e}") from e
+
+
 class RequirerProvider(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     provider_id: str
     redirect_uri: str
 
 
 class RequirerProviders(RootModel[list[RequirerProvider]]):
+    model_config = ConfigDict(defer_build=True)
+
     def __iter__(self) -> Iterator[RequirerProvider]:
         yield from self.root
 
@@ -329,6 +696,11 @@ class RequirerProviders(RootModel[list[RequirerProvider]]):
     def __len__(self) -> int:
         return len(self.root)
 
+    @cached_property
+    def redirect_uris(self) -> dict[str, str]:
+        """The redirect_uri of each provider, keyed by provider id."""
+        return {provider.provider_id: provider.redirect_uri for provider in self.root}
+
 
 class RelationReadyEvent(EventBase):
     """Event to notify the charm that the relation is ready."""
@@ -342,26 +714,46 @@ class RelationReadyEvent(EventBase):
         pass
 
 
+class RequirerFeaturesChangedEvent(EventBase):
+    """Event to notify the charm that the features supported by the requirer changed.
+
+    The providers must be published again with `create_providers` to use them.
+    """
+
+    def snapshot(self) -> dict:
+        """Save event."""
+        return {}
+
+    def restore(self, snapshot: dict) -> None:
+        """Restore event."""
+        pass
+
+
 class RedirectURIChangedEvent(EventBase):
-    """Event to notify the charm that the redirect_uri changed."""
+    """Event to notify the charm that the redirect_uri of a provider changed."""
 
-    def __init__(self, handle: Handle, redirect_uri: str) -> None:
+    def __init__(
+        self, handle: Handle, redirect_uri: str, provider_id: Optional[str] = None
+    ) -> None:
         super().__init__(handle)
         self.redirect_uri = redirect_uri
+        self.provider_id = provider_id
 
     def snapshot(self) -> dict:
         """Save redirect_uri."""
-        return {"redirect_uri": self.redirect_uri}
+        return {"redirect_uri": self.redirect_uri, "provider_id": self.provider_id}
 
     def restore(self, snapshot: dict) -> None:
         """Restore redirect_uri."""
         self.redirect_uri = snapshot["redirect_uri"]
+        self.provider_id = snapshot.get("provider_id")
 
 
 class ExternalIdpProviderEvents(ObjectEvents):
     """Event descriptor for events raised by `ExternalIdpProvider`."""
 
     ready = EventSource(RelationReadyEvent)
+    features_changed = EventSource(RequirerFeaturesChangedEvent)
     redirect_uri_changed = EventSource(RedirectURIChangedEvent)
 
 
@@ -369,11 +761,21 @@ class ExternalIdpProvider(Object):
     """Forward client configurations to Identity Broker."""
 
     on = ExternalIdpProviderEvents()
+    _stored = StoredState()
 
     def __init__(self, charm: CharmBase, relation_name: str = DEFAULT_RELATION_NAME) -> None:
         super().__init__(charm, relation_name)
         self._charm = charm
         self._relation_name = relation_name
+        # relation id -> (digest of the raw `providers` json, parsed requirer providers)
+        self._requirer_providers_cache: dict[int, tuple[str, RequirerProviders]] = {}
+        # The relations for which `ready` was already emitted, the last redirect_uri
+        # that was emitted and the requirer features the providers were encoded for.
+        # `secrets` maps provider ids to the id, revision, content digest and granted
+        # relations of the Juju secret that holds their credentials
+        self._stored.set_default(
+            ready_relations=[], redirect_uris={}, wire_features={}, secrets={}
+        )
 
         events = self._charm.on[relation_name]
         self.framework.observe(events.relation_joined, self._on_provider_endpoint_relation_joined)
@@ -383,25 +785,172 @@ class ExternalIdpProvider(Object):
         self.framework.observe(
             events.relation_departed, self._on_provider_endpoint_relation_departed
         )
+        self.framework.observe(events.relation_broken, self._on_provider_endpoint_relation_broken)
 
     def _on_provider_endpoint_relation_joined(self, event: RelationJoinedEvent) -> None:
+        if event.relation.id in self._stored.ready_relations:
+            return
+
+        self._stored.ready_relations.append(event.relation.id)
         self.on.ready.emit()
 
     def _on_provider_endpoint_relation_changed(self, event: RelationChangedEvent) -> None:
-        if not event.app:
+        self._check_wire_format(event.relation)
+
+        if not (data := self._get_requirer_providers(event.relation)):
             return
 
-        relation_data = event.relation.data[event.app]
-        if not (providers := relation_data.get("providers")):
+        self._update_redirect_uris(event.relation.id, data.redirect_uris)
+
+    def _on_provider_endpoint_relation_departed(self, event: RelationDepartedEvent) -> None:
+        if any(unit != event.departing_unit for unit in event.relation.units):
+            # Other units of the requirer application are still related
             return
 
-        if not (data := RequirerProviders.model_validate(json.loads(providers))):
+        self._update_redirect_uris(event.relation.id, {})
+
+    def _on_provider_endpoint_relation_broken(self, event: RelationBrokenEvent) -> None:
+        if event.relation.id in self._stored.ready_relations:
+            self._stored.ready_relations.remove(event.relation.id)
+        self._stored.wire_features.pop(str(event.relation.id), None)
+        for provider_id, entry in list(self._stored.secrets.items()):
+            if event.relation.id in entry["relations"]:
+                relations = [r for r in entry["relations"] if r != event.relation.id]
+                self._stored.secrets[provider_id] = {**entry, "relations": relations}
+
+        self._update_redirect_uris(event.relation.id, {})
+
+    def _update_redirect_uris(self, relation_id: int, redirect_uris: Mapping[str, str]) -> None:
+        """Emit `redirect_uri_changed` for each provider whose redirect_uri changed."""
+        key = str(relation_id)
+        previous = dict(self._stored.redirect_uris.get(key, {}))
+        if previous == redirect_uris:
             return
 
-        self.on.redirect_uri_changed.emit(redirect_uri=data[0].redirect_uri)
+        if redirect_uris:
+            self._stored.redirect_uris[key] = dict(redirect_uris)
+        else:
+            self._stored.redirect_uris.pop(key, None)
+
+        for provider_id in sorted(previous.keys() | redirect_uris.keys()):
+            if (redirect_uri := redirect_uris.get(provider_id, "")) != previous.get(
+                provider_id, ""
+            ):
+                self.on.redirect_uri_changed.emit(
+                    redirect_uri=redirect_uri, provider_id=provider_id
+                )
+
+    def _check_wire_format(self, relation: Relation) -> None:
+        """Ask the charm to publish the providers again if the requirer's features changed.
+
+        The providers are not rebuilt from the databag, which lacks the secret backend
+        of the providers whose credentials are published inline.
+        """
+        if not relation.app or not self._charm.unit.is_leader():
+            return
 
-    def _on_provider_endpoint_relation_departed(self, event: RelationDepartedEvent) -> None:
-        self.on.redirect_uri_changed.emit(redirect_uri="")
+        databag = relation.data[self._charm.app]
+        if not databag.get("providers"):
+            return
+
+        features = _parse_features(relation.data[relation.app])
+        if self._stored.wire_features.get(str(relation.id)) == sorted(features):
+            return
+
+        logger.info("The requirer features changed in relation %s", relation.id)
+        self.on.features_changed.emit()
+
+    def _publish(self, relation: Relation, providers: Providers) -> bool:
+        """Publish the providers in the format that the requirer supports.
+
+        Returns:
+            Whether the databag was written to.
+        """
+        features = _parse_features(relation.data[relation.app]) if relation.app else frozenset()
+        secrets = self._update_secrets(providers, relation) if JUJU_SECRETS in features else None
+        self._stored.wire_features[str(relation.id)] = sorted(features)
+        return _update_databag(
+            relation.data[self._charm.app], _encode_providers(providers, features, secrets)
+        )
+
+    def _update_secrets(
+        self, providers: Providers, relation: Relation
+    ) -> dict[str, dict[str, Any]]:
+        """Store the credentials of the providers that use the `secret` backend in Juju secrets.
+
+        A new secret revision is only created if the credentials changed. The stored
+        bookkeeping is per unit, so it is only trusted if the secret's latest revision
+        is still the stored one, i.e. no other leader unit changed the secret since.
+
+        Returns:
+            The id and revision of the secret of each provider, keyed by provider id.
+        """
+        refs = {}
+        for provider in providers:
+            if provider.secret_backend != "secret" or not provider.id:
+                continue
+
+            content = _secret_content(provider)
+            digest = _digest(json.dumps(content, sort_keys=True))
+            label = f"{self._relation_name}.{provider.id}"
+            if not (entry := self._find_secret(label, self._stored.secrets.get(provider.id))):
+                secret = self._charm.app.add_secret(content, label=label)
+                entry = {"id": secret.id, "revision": 1, "digest": digest, "relations": []}
+
+            if entry["digest"] != digest:
+                self.model.get_secret(id=entry["id"]).set_content(content)
+                entry = {**entry, "revision": entry["revision"] + 1, "digest": digest}
+
+            if relation.id not in entry["relations"]:
+                self.model.get_secret(id=entry["id"]).grant(relation)
+                entry = {**entry, "relations": [*entry["relations"], relation.id]}
+
+            self._stored.secrets[provider.id] = entry
+            refs[provider.id] = {"id": entry["id"], "revision": entry["revision"]}
+
+        return refs
+
+    def _find_secret(
+        self, label: str, stored: Optional[Mapping[str, Any]] = None
+    ) -> Optional[dict[str, Any]]:
+        """Find the secret of a provider, which may have been changed by another leader unit.
+
+        Args:
+            label: The label of the secret.
+            stored: The stored entry of the secret, reused if its revision is the latest one.
+        """
+        relations = list(stored["relations"]) if stored else []
+        try:
+            secret = (
+                self.model.get_secret(id=stored["id"])
+                if stored
+                else self.model.get_secret(label=label)
+            )
+            info = secret.get_info()
+        except SecretNotFoundError:
+            if stored:
+                # The secret was removed by another leader unit
+                return self._find_secret(label)
+            return None
+
+        if stored and info.revision == stored["revision"]:
+            return {**stored, "relations": relations}
+
+        content = secret.get_content(refresh=True)
+        return {
+            "id": info.id,
+            "revision": info.revision,
+            "digest": _digest(json.dumps(content, sort_keys=True)),
+            "relations": relations,
+        }
+
+    def _remove_secrets(self, provider_ids: Iterable[str]) -> None:
+        for provider_id in list(provider_ids):
+            entry = self._stored.secrets.pop(provider_id)
+            try:
+                self.model.get_secret(id=entry["id"]).remove_all_revisions()
+            except SecretNotFoundError:
+                logger.debug("Secret of provider %s already removed", provider_id)
 
     def is_ready(self) -> bool:
         """Checks if the relation is ready."""
@@ -412,7 +961,11 @@ class ExternalIdpProvider(Object):
             return
 
         for relation in self._charm.model.relations[self._relation_name]:
-            relation.data[self._charm.app]["providers"] = providers.model_dump_json()
+            if not self._publish(relation, providers):
+                logger.debug("Providers unchanged in relation %s, skipping write", relation.id)
+
+        secret_providers = {p.id for p in providers if p.secret_backend == "secret"}
+        self._remove_secrets(set(self._stored.secrets) - secret_providers)
 
     def remove_provider(self) -> None:
         if not self._charm.unit.is_leader():
@@ -421,8 +974,29 @@ class ExternalIdpProvider(Object):
         for relation in self._charm.model.relations[self._relation_name]:
             relation.data[self._charm.app].clear()
 
-    def get_redirect_uri(self, relation_id: Optional[int] = None) -> Optional[str]:
-        """Get the kratos client's redirect_uri."""
+        self._remove_secrets(set(self._stored.secrets))
+
+    def get_redirect_uri(
+        self, relation_id: Optional[int] = None, provider_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Get the kratos client's redirect_uri.
+
+        Args:
+            relation_id: The relation, needed if there are several relations.
+            provider_id: The provider, the first registered one if not set.
+        """
+        if not (data := self.get_requirer_providers(relation_id)):
+            return None
+
+        if provider_id is None:
+            return data[0].redirect_uri
+
+        return data.redirect_uris.get(provider_id)
+
+    def get_requirer_providers(
+        self, relation_id: Optional[int] = None
+    ) -> Optional[RequirerProviders]:
+        """Get the providers registered by the requirer, i.e. their redirect_uris."""
         if not self.model.unit.is_leader():
             return None
 
@@ -433,17 +1007,26 @@ class ExternalIdpProvider(Object):
         except TooManyRelatedAppsError:
             raise RuntimeError("More than one relations are defined. Please provide a relation_id")
 
-        if not relation or not relation.app:
+        if not relation:
             return None
 
-        relation_data = relation.data[relation.app]
-        if not (providers := relation_data.get("providers")):
+        return self._get_requirer_providers(relation)
+
+    def _get_requirer_providers(self, relation: Relation) -> Optional[RequirerProviders]:
+        """Parse the requirer's databag, reusing the cached result if it is unchanged."""
+        if not relation.app:
             return None
 
-        if not (data := RequirerProviders.model_validate(json.loads(providers))):
+        if not (providers_json := relation.data[relation.app].get("providers")):
             return None
 
-        return data[0].redirect_uri
+        digest = _digest(providers_json)
+        if (cached := self._requirer_providers_cache.get(relation.id)) and cached[0] == digest:
+            return cached[1]
+
+        data = RequirerProviders.model_validate_json(providers_json)
+        self._requirer_providers_cache[relation.id] = (digest, data)
+        return data
 
     @staticmethod
     def validate_provider_config(configurations: list[Mapping]) -> Optional[Providers]:
@@ -457,15 +1040,66 @@ class ExternalIdpProvider(Object):
         return providers
 
 
-class ClientConfigChangedEvent(EventBase):
-    """Event to notify the charm that a provider's client config changed."""
+# The impact of a provider change on Kratos
+NO_CHANGE = "none"
+COSMETIC_CHANGE = "cosmetic"
+# A change of the credentials, endpoints or any other field that Kratos must reload
+CREDENTIAL_CHANGE = "credential"
+COSMETIC_FIELDS = frozenset({"label"})
+
+
+def _provider_fields(provider: Provider) -> dict[str, str]:
+    """Get the digest of each serialized field of the provider."""
+    return {
+        name: _digest(json.dumps(value, sort_keys=True))
+        for name, value in provider.model_dump(mode="json", by_alias=True).items()
+    }
+
+
+def _diff_fields(previous: Optional[Mapping[str, str]], current: Mapping[str, str]) -> list[str]:
+    """Get the names of the fields that differ, all of them if there is no previous provider."""
+    if previous is None:
+        return sorted(current)
+
+    return sorted(
+        name
+        for name in previous.keys() | current.keys()
+        if previous.get(name) != current.get(name)
+    )
+
 
-    def __init__(self, handle: Handle, provider: Provider) -> None:
+def _classify_change(changed_fields: Iterable[str]) -> str:
+    if not (changed := set(changed_fields)):
+        return NO_CHANGE
+
+    if changed <= COSMETIC_FIELDS:
+        return COSMETIC_CHANGE
+
+    return CREDENTIAL_CHANGE
+
+
+class ClientConfigChangedEvent(EventBase):
+    """Event to notify the charm that a provider's client config changed.
+
+    `changed_fields` lists the fields that differ from the last provider seen in the
+    relation, and `impact` tells whether the change is `COSMETIC_CHANGE`, e.g. only the
+    label changed, or a `CREDENTIAL_CHANGE` that Kratos needs to reload.
+    """
+
+    def __init__(
+        self,
+        handle: Handle,
+        provider: Provider,
+        changed_fields: Optional[list[str]] = None,
+        impact: str = CREDENTIAL_CHANGE,
+    ) -> None:
         super().__init__(handle)
         self.client_id = provider.client_id
         self.provider = provider.provider
         self.provider_id = provider.id
         self.relation_id = provider.relation_id
+        self.changed_fields = changed_fields or []
+        self.impact = impact
 
     def snapshot(self) -> dict:
         """Save event."""
@@ -474,6 +1108,8 @@ class ClientConfigChangedEvent(EventBase):
             "provider": self.provider,
             "provider_id": self.provider_id,
             "relation_id": self.relation_id,
+            "changed_fields": self.changed_fields,
+            "impact": self.impact,
         }
 
     def restore(self, snapshot: dict) -> None:
@@ -482,6 +1118,9 @@ class ClientConfigChangedEvent(EventBase):
         self.provider = snapshot["provider"]
         self.provider_id = snapshot["provider_id"]
         self.relation_id = snapshot["relation_id"]
+        # Events deferred by older versions of the library do not have these
+        self.changed_fields = snapshot.get("changed_fields", [])
+        self.impact = snapshot.get("impact", CREDENTIAL_CHANGE)
 
 
 class ClientConfigRemovedEvent(EventBase):
@@ -502,6 +1141,78 @@ class ClientConfigRemovedEvent(EventBase):
         self.relation_id = snapshot["relation_id"]
 
 
+_ADDED, _UPDATED, _REMOVED = "added", "updated", "removed"
+
+
+def _merge_change(previous: Optional[str], current: str) -> Optional[str]:
+    """Merge a provider change into a change that is not delivered yet."""
+    if previous == _ADDED:
+        return None if current == _REMOVED else _ADDED
+
+    if previous == _REMOVED and current == _ADDED:
+        return _UPDATED
+
+    return current
+
+
+@dataclass(frozen=True)
+class ProvidersChangeset:
+    """The provider ids that were added, updated or removed since the last delivery."""
+
+    added: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_changes(cls, changes: Mapping[str, str]) -> "ProvidersChangeset":
+        return cls(
+            added=sorted(id_ for id_, change in changes.items() if change == _ADDED),
+            updated=sorted(id_ for id_, change in changes.items() if change == _UPDATED),
+            removed=sorted(id_ for id_, change in changes.items() if change == _REMOVED),
+        )
+
+
+@dataclass(frozen=True)
+class KratosProvidersConfig:
+    """The providers rendered for Kratos, sorted by id, and a digest of their content."""
+
+    providers: list[dict[str, Any]]
+    fingerprint: str
+
+
+class ProvidersIndex:
+    """Lookup tables over the providers of all the relations, built in a single pass.
+
+    Provider ids must be unique across relations. If several relations publish the same
+    provider id, `by_id` holds the first one and `duplicates` maps the id to the ids of
+    all the relations publishing it.
+    """
+
+    def __init__(self, providers: Iterable[Provider]) -> None:
+        self.by_id: dict[str, Provider] = {}
+        self.by_relation_id: dict[int, list[Provider]] = {}
+        self.by_client: dict[tuple[str, str], Provider] = {}
+        self.duplicates: dict[str, list[Optional[int]]] = {}
+
+        for provider in providers:
+            provider_id = str(provider.id)
+            if first := self.by_id.get(provider_id):
+                relation_ids = self.duplicates.setdefault(provider_id, [first.relation_id])
+                relation_ids.append(provider.relation_id)
+            else:
+                self.by_id[provider_id] = provider
+
+            if provider.relation_id is not None:
+                self.by_relation_id.setdefault(provider.relation_id, []).append(provider)
+            self.by_client.setdefault((provider.provider, provider.client_id), provider)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, provider_id: str) -> Optional[Provider]:
+        return self.by_id.get(provider_id)
+
+
 class ExternalIdpRequirerEvents(ObjectEvents):
     """Event descriptor for events raised by `ExternalIdpRequirerEvents`."""
 
@@ -510,16 +1221,72 @@ class ExternalIdpRequirerEvents(ObjectEvents):
 
 
 class ExternalIdpRequirer(Object):
-    """Receive the External Idp configurations for Kratos."""
+    """Receive the External Idp configurations for Kratos.
 
-    on = ExternalIdpRequirerEvents()
+    If `persist_providers` is set, the validated providers of each relation are
+    stored in the unit's state together with the digest of the relation data, so
+    that later dispatches do not validate unchanged relation data again. The
+    persisted providers and the quarantined relations are dropped when the charm is
+    upgraded.
 
-    def __init__(self, charm: CharmBase, relation_name: str = DEFAULT_RELATION_NAME) -> None:
+    `get_providers` loads the remote databags of the relations concurrently, using
+    up to `prefetch_workers` threads. Set it to 1 to load them sequentially.
+
+    If `on_providers_changed` is set, the provider changes of all the relation events
+    of a dispatch are coalesced in a single `ProvidersChangeset`, that is passed to the
+    callback once, at the end of the dispatch. If the callback returns False, e.g. because
+    the workload is not ready, the changes are kept and merged with the changes of the
+    next dispatches, until the callback succeeds.
+
+    If `accept_v0_providers` is set, the providers published by integrators that still
+    use the v0 library are read too, and converted to the v1 `Provider` models. The
+    version of each relation's payload is detected from its content.
+    """
+
+    on = ExternalIdpRequirerEvents()
+    _stored = StoredState()
+
+    def __init__(
+        self,
+        charm: CharmBase,
+        relation_name: str = DEFAULT_RELATION_NAME,
+        persist_providers: bool = False,
+        prefetch_workers: int = DEFAULT_PREFETCH_WORKERS,
+        on_providers_changed: Optional[Callable[[ProvidersChangeset], bool]] = None,
+        accept_v0_providers: bool = False,
+    ) -> None:
         super().__init__(charm, relation_name)
         self._charm = charm
         self._relation_name = relation_name
+        self._persist_providers = persist_providers
+        self._accept_v0_providers = accept_v0_providers
+        self._prefetch_workers = prefetch_workers
+        self._on_providers_changed = on_providers_changed
+        # relation id -> (digest of the raw `providers` json, parsed providers)
+        self._providers_cache: dict[int, tuple[str, Providers]] = {}
+        # The index of the providers, and the relation digests it was built from
+        self._index_cache: Optional[tuple[tuple[tuple[int, str], ...], ProvidersIndex]] = None
+        # relation id -> (digest of the raw `providers` json, rendered providers and their json)
+        self._rendered_cache: dict[int, tuple[str, list[tuple[dict[str, Any], str]]]] = {}
+        # The relations whose remote databag was already prefetched in this dispatch
+        self._prefetched: set[int] = set()
+        # `seen_providers` maps relation ids to the field digests of their providers,
+        # `pending_changes` maps provider ids to their undelivered change
+        # `quarantined` maps relation ids to the digest and error of their invalid data
+        # `secret_contents` maps secret ids to their revision, relation id and content
+        self._stored.set_default(
+            providers={},
+            seen_providers={},
+            pending_changes={},
+            quarantined={},
+            secret_contents={},
+        )
 
         events = self._charm.on[relation_name]
+        self.framework.observe(
+            events.relation_created,
+            self._on_provider_endpoint_relation_created,
+        )
         self.framework.observe(
             events.relation_changed,
             self._on_provider_endpoint_relation_changed,
@@ -528,6 +1295,10 @@ class ExternalIdpRequirer(Object):
             events.relation_broken,
             self._on_provider_endpoint_relation_broken,
         )
+        self.framework.observe(self._charm.on.secret_changed, self._on_secret_changed)
+        self.framework.observe(self._charm.on.upgrade_charm, self._on_upgrade_charm)
+        if on_providers_changed:
+            self.framework.observe(self.framework.on.pre_commit, self._on_pre_commit)
 
     @property
     def relations(self) -> list[Relation]:
@@ -537,36 +1308,246 @@ class ExternalIdpRequirer(Object):
             if relation.active
         ]
 
+    def _on_provider_endpoint_relation_created(self, event: RelationCreatedEvent) -> None:
+        if not self._charm.unit.is_leader():
+            return
+
+        _update_databag(event.relation.data[self.model.app], {"features": _FEATURES_JSON})
+
     def _on_provider_endpoint_relation_changed(self, event: RelationEvent) -> None:
-        if not (app := event.app):
+        self._update_relation(event.relation)
+
+    def _on_upgrade_charm(self, _: UpgradeCharmEvent) -> None:
+        # The new charm or library revision may decode the same payloads differently
+        self._stored.providers = {}
+        self._stored.quarantined = {}
+
+    def _on_secret_changed(self, event: SecretChangedEvent) -> None:
+        if not (cached := self._stored.secret_contents.pop(event.secret.id, None)):
             return
 
-        relation_data = event.relation.data[app]
-        if not (providers_json := relation_data.get("providers")):
-            self.on.client_config_removed.emit(event.relation.id)
+        # Parse the providers again, reading only the changed secret
+        relation_id = cached["relation_id"]
+        self._providers_cache.pop(relation_id, None)
+        self._stored.providers.pop(str(relation_id), None)
+        if relation := self.model.get_relation(self._relation_name, relation_id):
+            self._update_relation(relation)
+
+    def _update_relation(self, relation: Relation) -> None:
+        """Parse the providers of the relation and emit the events for their changes."""
+        if not relation.app:
             return
 
-        providers = Providers.model_validate_json(providers_json)
+        relation_data = relation.data[relation.app]
+        if relation_data.get("providers"):
+            if (providers := self._parse_providers(relation.id, relation_data)) is None:
+                # The relation is quarantined, the other relations are not affected
+                return
+        else:
+            providers = None
+
+        if not providers:
+            self._forget_providers(relation.id)
+            self._record_changes(relation.id, [])
+            self.on.client_config_removed.emit(relation.id)
+            return
 
-        provider = providers[0]
-        provider.relation_id = event.relation.id
-        self.on.client_config_changed.emit(provider)
+        changed_fields = self._record_changes(relation.id, providers)
+
+        for provider in providers:
+            if (impact := _classify_change(changed_fields[provider.id])) == NO_CHANGE:
+                logger.debug("Provider %s is unchanged, skipping event", provider.id)
+                continue
+
+            self.on.client_config_changed.emit(provider, changed_fields[provider.id], impact)
 
     def _on_provider_endpoint_relation_broken(self, event: RelationBrokenEvent) -> None:
+        self._forget_providers(event.relation.id)
+        self._record_changes(event.relation.id, [])
         self.on.client_config_removed.emit(event.relation.id)
 
-    def update_registered_provider(self, providers: RequirerProviders, relation_id: int) -> None:
-        if not self._charm.unit.is_leader():
+    def _on_pre_commit(self, _: EventBase) -> None:
+        if not self._on_providers_changed or not self._stored.pending_changes:
             return
 
-        if not (
-            relation := self.model.get_relation(
-                relation_name=self._relation_name, relation_id=relation_id
-            )
-        ):
+        changeset = ProvidersChangeset.from_changes(self._stored.pending_changes)
+        if self._on_providers_changed(changeset) is False:
+            logger.info("Provider changes not applied, they will be delivered again")
             return
 
-        relation.data[self.model.app].update({"providers": providers.model_dump_json()})
+        self._stored.pending_changes = {}
+
+    def _record_changes(
+        self, relation_id: int, providers: Iterable[Provider]
+    ) -> dict[str, list[str]]:
+        """Compare the providers with the last seen ones and record the changes.
+
+        Returns:
+            The names of the changed fields, keyed by provider id.
+        """
+        key = str(relation_id)
+        previous = {
+            provider_id: dict(fields)
+            for provider_id, fields in self._stored.seen_providers.get(key, {}).items()
+        }
+        current = {provider.id: _provider_fields(provider) for provider in providers}
+        changed_fields = {
+            provider_id: _diff_fields(previous.get(provider_id), fields)
+            for provider_id, fields in current.items()
+        }
+
+        if current:
+            self._stored.seen_providers[key] = current
+        else:
+            self._stored.seen_providers.pop(key, None)
+
+        if self._on_providers_changed:
+            changes = dict.fromkeys(previous.keys() - current.keys(), _REMOVED)
+            for provider_id, fields in changed_fields.items():
+                if provider_id not in previous:
+                    changes[provider_id] = _ADDED
+                elif fields:
+                    changes[provider_id] = _UPDATED
+
+            pending_changes = self._stored.pending_changes
+            for provider_id, change in changes.items():
+                if merged := _merge_change(pending_changes.get(provider_id), change):
+                    pending_changes[provider_id] = merged
+                else:
+                    pending_changes.pop(provider_id, None)
+
+        return changed_fields  # type: ignore[return-value]
+
+    def _parse_providers(self, relation_id: int, data: Mapping[str, str]) -> Optional[Providers]:
+        """Parse the providers payload, reusing the cached result if it is unchanged.
+
+        If the payload is invalid, the relation is quarantined and None is returned. The
+        payload is not parsed again until it changes.
+        """
+        digest = _payload_digest(data)
+        if (cached := self._providers_cache.get(relation_id)) and cached[0] == digest:
+            return cached[1]
+
+        key = str(relation_id)
+        if (quarantined := self._stored.quarantined.get(key)) and quarantined["digest"] == digest:
+            return None
+
+        if not (providers := self._load_persisted_providers(relation_id, digest)):
+            try:
+                providers = _decode_providers(
+                    data,
+                    lambda secret_id, revision: self._read_secret(
+                        relation_id, secret_id, revision
+                    ),
+                    self._accept_v0_providers,
+                )
+            except ValueError as e:
+                logger.error("Invalid providers in relation %s, quarantining it: %s", key, e)
+                self._forget_providers(relation_id)
+                self._stored.quarantined[key] = {"digest": digest, "error": str(e)}
+                return None
+
+            for provider in providers:
+                provider.relation_id = relation_id
+            self._persist(relation_id, digest, providers)
+
+        self._stored.quarantined.pop(key, None)
+        self._providers_cache[relation_id] = (digest, providers)
+        return providers
+
+    def _read_secret(self, relation_id: int, secret_id: str, revision: int) -> dict[str, str]:
+        """Get the content of a secret, only reading it if the revision changed.
+
+        The content is cached in the unit's local storage, like the persisted providers,
+        until the referenced revision changes or the secret's owner publishes a new
+        revision.
+        """
+        cached = self._stored.secret_contents.get(secret_id)
+        if cached and cached["revision"] == revision:
+            return dict(cached["content"])
+
+        content = _get_secret_content(self.model, secret_id)
+        self._stored.secret_contents[secret_id] = {
+            "revision": revision,
+            "relation_id": relation_id,
+            "content": content,
+        }
+        return content
+
+    @property
+    def quarantined_relations(self) -> dict[int, str]:
+        """The relations whose providers are invalid, mapped to the validation error."""
+        return {
+            int(relation_id): entry["error"]
+            for relation_id, entry in self._stored.quarantined.items()
+        }
+
+    def _load_persisted_providers(self, relation_id: int, digest: str) -> Optional[Providers]:
+        if not self._persist_providers:
+            return None
+
+        if not (entry := self._stored.providers.get(str(relation_id))):
+            return None
+
+        if entry["digest"] != digest:
+            return None
+
+        return Providers.model_construct([
+            construct_provider(data, relation_id) for data in json.loads(entry["providers"])
+        ])
+
+    def _persist(self, relation_id: int, digest: str, providers: Providers) -> None:
+        if not self._persist_providers:
+            return
+
+        self._stored.providers[str(relation_id)] = {
+            "digest": digest,
+            "providers": json.dumps([provider.model_dump() for provider in providers]),
+        }
+
+    def _forget_providers(self, relation_id: int) -> None:
+        self._providers_cache.pop(relation_id, None)
+        self._stored.providers.pop(str(relation_id), None)
+        self._stored.quarantined.pop(str(relation_id), None)
+        for secret_id, cached in list(self._stored.secret_contents.items()):
+            if cached["relation_id"] == relation_id:
+                del self._stored.secret_contents[secret_id]
+
+    def update_registered_provider(self, providers: RequirerProviders, relation_id: int) -> None:
+        self.update_registered_providers({relation_id: providers})
+
+    def update_registered_providers(self, providers: Mapping[int, RequirerProviders]) -> int:
+        """Update the registered providers of several relations at once.
+
+        The relation databags that already contain the same providers are not written to.
+
+        Args:
+            providers: The registered providers, keyed by relation id.
+
+        Returns:
+            The number of relation databags that were written to.
+        """
+        if not self._charm.unit.is_leader():
+            return 0
+
+        relations = {
+            relation.id: relation for relation in self._charm.model.relations[self._relation_name]
+        }
+
+        written = 0
+        for relation_id, registered_providers in providers.items():
+            if not (relation := relations.get(relation_id)):
+                logger.debug("Relation %s not found, skipping it", relation_id)
+                continue
+
+            data = {
+                "providers": _canonical_json(registered_providers),
+                "features": _FEATURES_JSON,
+            }
+            if _update_databag(relation.data[self.model.app], data):
+                written += 1
+
+        return written
 
     def remove_registered_provider(self, relation_id: int) -> None:
         if not self._charm.unit.is_leader():
@@ -579,25 +1560,136 @@ class ExternalIdpRequirer(Object):
         ):
             return
 
-        relation.data[self.model.app].clear()
+        # The advertised features are kept
+        _update_databag(relation.data[self.model.app], {"providers": ""})
 
     def get_providers_from_relation(self, relation: Relation) -> Optional[Providers]:
         if not relation.app:
             return None
 
         relation_data = relation.data[relation.app]
-        if not (providers_json := relation_data.get("providers")):
+        if not relation_data.get("providers"):
+            self._forget_providers(relation.id)
             return None
 
-        providers = Providers.model_validate_json(providers_json)
-        for provider in providers:
-            provider.relation_id = relation.id
-
-        return providers
+        return self._parse_providers(relation.id, relation_data)
 
     def get_providers(self) -> list[Provider]:
+        relations = self.relations
+        self._prefetch_relation_data(relations)
+
         return [
             provider
-            for relation in self.relations
+            for relation in relations
             for provider in self.get_providers_from_relation(relation) or []
         ]
+
+    def get_providers_index(self) -> ProvidersIndex:
+        """Get the providers of all the relations, indexed for lookups.
+
+        The index is only built again if the data of a relation changed.
+        """
+        providers = self.get_providers()
+        key = tuple(
+            sorted(
+                (relation.id, self._providers_cache[relation.id][0])
+                for relation in self.relations
+                if relation.id in self._providers_cache
+            )
+        )
+        if self._index_cache and self._index_cache[0] == key:
+            return self._index_cache[1]
+
+        index = ProvidersIndex(providers)
+        for provider_id, relation_ids in index.duplicates.items():
+            logger.warning(
+                "Provider id %s is published by several relations: %s", provider_id, relation_ids
+            )
+
+        self._index_cache = (key, index)
+        return index
+
+    def render_kratos_providers(self) -> KratosProvidersConfig:
+        """Render the providers of all the relations for Kratos' oidc method config.
+
+        Only the providers of the relations whose data changed since the last call are
+        rendered again. If `persist_providers` is set, the rendered providers are persisted
+        with the validated ones, so they are reused across dispatches too. The fingerprint
+        only changes if the rendered providers change, so it can be used to skip reloading
+        Kratos.
+        """
+        relations = self.relations
+        self._prefetch_relation_data(relations)
+
+        rendered = []
+        for relation in relations:
+            if not self.get_providers_from_relation(relation):
+                self._rendered_cache.pop(relation.id, None)
+                continue
+
+            digest, providers = self._providers_cache[relation.id]
+            if not (cached := self._rendered_cache.get(relation.id)) or cached[0] != digest:
+                cached = (digest, self._render_relation(relation.id, digest, providers))
+                self._rendered_cache[relation.id] = cached
+
+            rendered.extend(cached[1])
+
+        rendered.sort(key=lambda item: (item[0]["id"], item[1]))
+        return KratosProvidersConfig(
+            providers=[entry for entry, _ in rendered],
+            fingerprint=_digest("\n".join(entry_json for _, entry_json in rendered)),
+        )
+
+    def _render_relation(
+        self, relation_id: int, digest: str, providers: Providers
+    ) -> list[tuple[dict[str, Any], str]]:
+        """Render the providers of a relation, reusing the persisted ones if they are unchanged.
+
+        Returns:
+            The rendered providers and their json.
+        """
+        key = str(relation_id)
+        persisted = self._stored.providers.get(key) if self._persist_providers else None
+        if persisted and persisted["digest"] != digest:
+            persisted = None
+
+        if persisted and (rendered_json := persisted.get("rendered")) is not None:
+            return [
+                (json.loads(entry_json), entry_json) for entry_json in json.loads(rendered_json)
+            ]
+
+        entries = [render_kratos_provider(provider) for provider in providers]
+        rendered = [(entry, json.dumps(entry, sort_keys=True)) for entry in entries]
+        if persisted:
+            self._stored.providers[key] = {
+                **persisted,
+                "rendered": json.dumps([entry_json for _, entry_json in rendered]),
+            }
+
+        return rendered
+
+    def _prefetch_relation_data(self, relations: list[Relation]) -> None:
+        """Load the remote application databags of the relations concurrently.
+
+        Every databag load is a `relation-get` call. Ops keeps the loaded data, so
+        the reads done afterwards by `get_providers_from_relation` are served from memory,
+        and each relation is prefetched at most once per dispatch.
+        """
+        relations = [
+            relation
+            for relation in relations
+            if relation.app and relation.id not in self._prefetched
+        ]
+        if (workers := min(self._prefetch_workers, len(relations))) < 2:
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Consume the results, to raise any error that happened in the workers
+            list(executor.map(self._load_remote_app_data, relations))
+
+        self._prefetched.update(relation.id for relation in relations)
+
+    @staticmethod
+    def _load_remote_app_data(relation: Relation) -> None:
+        if relation.app:
+            relation.data[relation.app].get("providers")
@@ -0,0 +1,132 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Loading of the provider catalog attached as a charm resource."""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+
+import yaml
+from charms.kratos_external_idp_integrator.v1.kratos_external_provider import (
+    Providers,
+    construct_provider,
+)
+from pydantic import ValidationError
+
+CATALOG_RESOURCE = "provider-catalog"
+# Increment it when the entries of a loaded catalog change format
+CATALOG_FORMAT = 1
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class Catalog:
+    """The validated entries of a provider catalog, and the errors of the invalid ones."""
+
+    digest: str
+    entries: list[dict[str, Any]] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def ids(self) -> list[str]:
+        return [entry["id"] for entry in self.entries]
+
+
+def catalog_digest(path: Path) -> str:
+    """Get the digest of the catalog file, without loading it in memory."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_json_lines(f: TextIO) -> bool:
+    for line in f:
+        if line.strip():
+            f.seek(0)
+            return line.lstrip().startswith("{")
+
+    return False
+
+
+def _read_json_lines(f: TextIO, errors: list[str]) -> Iterator[tuple[str, Any]]:
+    for lineno, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            yield f"line {lineno}", json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(f"line {lineno}: invalid JSON: {e.msg}")
+
+
+def _read_yaml(f: TextIO, errors: list[str]) -> Iterator[tuple[str, Any]]:
+    """Read the entries of the YAML documents, each one being an entry or a list of entries."""
+    position = 0
+    try:
+        for document in yaml.safe_load_all(f):
+            for entry in document if isinstance(document, list) else [document]:
+                position += 1
+                yield f"entry {position}", entry
+    except yaml.YAMLError as e:
+        # The rest of the stream can not be parsed
+        errors.append(f"entry {position + 1}: invalid YAML: {e}")
+
+
+def _format_error(error: ValidationError) -> str:
+    # The first item of the location is the index in the single entry list
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in e['loc'][1:]) or 'provider'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+def load_catalog(path: Path) -> Catalog:
+    """Validate the catalog entries one by one, collecting the errors of the invalid ones.
+
+    The catalog is either in JSON Lines, with one provider per line, or in YAML, with a list
+    of providers or one provider per document.
+    """
+    catalog = Catalog(digest=catalog_digest(path))
+    ids: set[str] = set()
+    with path.open() as f:
+        read_entries = _read_json_lines if _is_json_lines(f) else _read_yaml
+        for position, entry in read_entries(f, catalog.errors):
+            if not isinstance(entry, dict):
+                catalog.errors.append(f"{position}: expected a provider configuration")
+                continue
+
+            try:
+                provider = Providers.model_validate([entry])[0]
+            except ValidationError as e:
+                catalog.errors.append(f"{position}: {_format_error(e)}")
+                continue
+
+            if provider.id in ids:
+                catalog.errors.append(f"{position}: duplicate provider id {provider.id}")
+                continue
+
+            ids.add(provider.id)
+            dumped = provider.model_dump()
+            # The secret backend is not serialized, keep it only if the entry overrides it
+            if "secret_backend" in entry:
+                dumped["secret_backend"] = provider.secret_backend
+            catalog.entries.append(dumped)
+
+    return catalog
+
+
+def catalog_providers(entries: list[dict[str, Any]], secret_backend: str) -> Providers:
+    """Rebuild the providers of the validated catalog entries, without validating them again.
+
+    Args:
+        entries: The entries of a `Catalog`.
+        secret_backend: The secret backend of the entries that do not override it.
+    """
+    return Providers.model_construct([
+        construct_provider({"secret_backend": secret_backend, **entry}) for entry in entries
+    ])
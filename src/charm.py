@@ -4,12 +4,19 @@
 
 """A Juju charm for integrating an identity broker with an external IdP."""
 
+import hashlib
+import json
 import logging
-from typing import Any
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Mapping, Optional
 
+import yaml
 from charms.kratos_external_idp_integrator.v1.kratos_external_provider import (
     ExternalIdpProvider,
+    Providers,
     RedirectURIChangedEvent,
+    RequirerProviders,
 )
 from ops import (
     ActionEvent,
@@ -18,10 +25,23 @@ from ops import (
     CharmBase,
     CollectStatusEvent,
     ConfigChangedEvent,
+    EventBase,
     MaintenanceStatus,
+    StoredState,
+    UpgradeCharmEvent,
     WaitingStatus,
     main,
 )
+from ops.model import ModelError
+
+from catalog import (
+    CATALOG_FORMAT,
+    CATALOG_RESOURCE,
+    Catalog,
+    catalog_digest,
+    catalog_providers,
+    load_catalog,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -29,18 +49,26 @@ KRATOS_EXTERNAL_IDP_INTEGRATION_NAME = "kratos-external-idp"
 
 
 class KratosIdpIntegratorCharm(CharmBase):
+    _stored = StoredState()
+
     def __init__(self, *args: Any) -> None:
         super().__init__(*args)
+        self._stored.set_default(reconcile_fingerprint="", provider_ids=None, catalog={})
         self.external_idp_provider = ExternalIdpProvider(self)
 
         # Lifecycle events
         self.framework.observe(self.on.config_changed, self._on_config_changed)
+        self.framework.observe(self.on.upgrade_charm, self._on_upgrade_charm)
         self.framework.observe(self.on.collect_unit_status, self._on_collect_status)
 
         # External IdP provider
         self.framework.observe(
             self.external_idp_provider.on.ready,
-            self._on_config_changed,
+            self._on_inputs_changed,
+        )
+        self.framework.observe(
+            self.external_idp_provider.on.features_changed,
+            self._on_inputs_changed,
         )
         self.framework.observe(
             self.external_idp_provider.on.redirect_uri_changed,
@@ -53,13 +81,191 @@ class KratosIdpIntegratorCharm(CharmBase):
             self._on_get_redirect_uri,
         )
 
+    # The following properties are computed at most once per dispatch and are
+    # shared by the event handlers and the status collection.
+
+    @property
+    def _catalog_digest(self) -> Optional[str]:
+        return self._stored.catalog.get("digest")
+
+    @cached_property
+    def _catalog(self) -> Optional[Catalog]:
+        """The provider catalog, as loaded the last time the resource was checked."""
+        if not (cached := self._stored.catalog):
+            return None
+
+        return Catalog(
+            digest=cached["digest"],
+            entries=json.loads(cached["entries"]),
+            errors=list(cached["errors"]),
+        )
+
+    @cached_property
+    def _provider_configs(self) -> Optional[list[Mapping]]:
+        """The configurations of the providers.
+
+        They are read from the `providers` option if it is set, or else from the single
+        provider options.
+        """
+        if not (providers := self.config.get("providers")):
+            return [self.config]
+
+        try:
+            configs = yaml.safe_load(str(providers))
+        except yaml.YAMLError as e:
+            logger.error("Invalid `providers` config: %s", e)
+            return None
+
+        if not isinstance(configs, list) or not all(isinstance(c, dict) for c in configs):
+            logger.error("The `providers` config must be a list of provider configurations")
+            return None
+
+        return [{"secret_backend": self.config["secret_backend"], **c} for c in configs]
+
+    @cached_property
+    def _providers(self) -> Optional[Providers]:
+        # The catalog entries were validated when the resource was loaded
+        if catalog := self._catalog:
+            return catalog_providers(catalog.entries, str(self.config["secret_backend"]))
+
+        if (configs := self._provider_configs) is None:
+            return None
+
+        if not (providers := self.external_idp_provider.validate_provider_config(configs)):
+            return providers
+
+        ids = [p.id for p in providers]
+        if duplicates := sorted({id_ for id_ in ids if ids.count(id_) > 1}):
+            logger.error("Duplicate provider ids in the `providers` config: %s", duplicates)
+            return None
+
+        return providers
+
+    @cached_property
+    def _provider_ids(self) -> Optional[list[str]]:
+        """The ids of the valid providers, as of the last reconciliation.
+
+        The status is collected in every dispatch, so the config is only validated for it
+        until it is reconciled.
+        """
+        if not self._stored.reconcile_fingerprint:
+            return [p.id for p in self._providers] if self._providers else None
+
+        ids = self._stored.provider_ids
+        return list(ids) if ids else None
+
+    @cached_property
+    def _is_ready(self) -> bool:
+        return self.external_idp_provider.is_ready()
+
+    @cached_property
+    def _is_leader(self) -> bool:
+        return self.unit.is_leader()
+
+    @cached_property
+    def _requirer_providers(self) -> Optional[RequirerProviders]:
+        if not self._is_leader or not self._is_ready:
+            return None
+
+        return self.external_idp_provider.get_requirer_providers()
+
+    @cached_property
+    def _reconcile_fingerprint(self) -> str:
+        """A digest of all the inputs that the reconciliation depends on."""
+        inputs = {
+            "config": dict(self.config),
+            "leader": self._is_leader,
+            "catalog": self._catalog_digest,
+            "relations": {
+                str(relation.id): [
+                    relation.data[relation.app].get("providers"),
+                    relation.data[relation.app].get("features"),
+                ]
+                if relation.app
+                else None
+                for relation in self.model.relations[KRATOS_EXTERNAL_IDP_INTEGRATION_NAME]
+            },
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    @property
+    def _is_registered(self) -> bool:
+        """Whether the requirer registered the published providers."""
+        if not (requirer_providers := self._requirer_providers):
+            return False
+
+        if not self._catalog_digest and not self.config.get("providers") or not self._provider_ids:
+            return True
+
+        return all(id_ in requirer_providers.redirect_uris for id_ in self._provider_ids)
+
+    def _get_redirect_uri(self, provider_id: Optional[str] = None) -> Optional[str]:
+        if not (requirer_providers := self._requirer_providers):
+            return None
+
+        if provider_id is None:
+            return requirer_providers[0].redirect_uri
+
+        return requirer_providers.redirect_uris.get(provider_id)
+
+    def _load_catalog(self) -> None:
+        """Load the provider catalog resource, only validating it again if its content changed.
+
+        Attaching a resource triggers upgrade-charm, followed by config-changed, so the
+        resource is only checked on these events and the other dispatches use the stored
+        catalog. It is also loaded again if another charm revision stored it in another
+        format.
+        """
+        try:
+            path: Optional[Path] = self.model.resources.fetch(CATALOG_RESOURCE)
+        except (ModelError, NameError):
+            path = None
+
+        # An empty file is attached to detach the catalog
+        if not path or not path.stat().st_size:
+            self._stored.catalog = {}
+            return
+
+        cached = self._stored.catalog
+        if cached.get("format") == CATALOG_FORMAT and cached["digest"] == catalog_digest(path):
+            return
+
+        catalog = load_catalog(path)
+        for error in catalog.errors:
+            logger.error("Invalid provider catalog entry, %s", error)
+
+        self._stored.catalog = {
+            "format": CATALOG_FORMAT,
+            "digest": catalog.digest,
+            "entries": json.dumps(catalog.entries),
+            "errors": catalog.errors,
+        }
+
     def _on_config_changed(self, event: ConfigChangedEvent) -> None:
-        if not (providers := self.external_idp_provider.validate_provider_config([self.config])):
+        self._load_catalog()
+        self._on_inputs_changed(event)
+
+    def _on_inputs_changed(self, event: EventBase) -> None:
+        if self._stored.reconcile_fingerprint == self._reconcile_fingerprint:
+            logger.debug("The charm inputs are unchanged, skipping reconciliation")
+            return
+
+        self._reconcile()
+        self._stored.provider_ids = [p.id for p in self._providers] if self._providers else None
+        self._stored.reconcile_fingerprint = self._reconcile_fingerprint
+
+    def _on_upgrade_charm(self, event: UpgradeCharmEvent) -> None:
+        # The new charm revision may load and publish the same inputs differently
+        self._stored.reconcile_fingerprint = ""
+        self._load_catalog()
+
+    def _reconcile(self) -> None:
+        if not (providers := self._providers):
             return
 
         self.unit.status = MaintenanceStatus("Configuring the charm")
 
-        if not self.external_idp_provider.is_ready():
+        if not self._is_ready:
             return
 
         if not self.config["enabled"]:
@@ -72,15 +278,15 @@ class KratosIdpIntegratorCharm(CharmBase):
         logger.info(f"The client's redirect_uri changed to {event.redirect_uri}")
 
     def _on_collect_status(self, event: CollectStatusEvent) -> None:
-        if not self.external_idp_provider.validate_provider_config([self.config]):
+        if not self._provider_ids:
             event.add_status(BlockedStatus("Invalid OIDC provider configuration"))
 
-        if not self.external_idp_provider.is_ready():
+        if not self._is_ready:
             event.add_status(
                 BlockedStatus(f"Missing integration {KRATOS_EXTERNAL_IDP_INTEGRATION_NAME}")
             )
 
-        if not self.external_idp_provider.get_redirect_uri() and self.config["enabled"]:
+        if not self._is_registered and self.config["enabled"]:
             event.add_status(
                 WaitingStatus("Waiting for the requirer charm to register the OIDC provider")
             )
@@ -88,10 +294,15 @@ class KratosIdpIntegratorCharm(CharmBase):
         if not self.config["enabled"]:
             event.add_status(ActiveStatus("The OIDC provider is disabled"))
 
+        if errors := len(self._stored.catalog.get("errors", [])):
+            event.add_status(
+                ActiveStatus(f"{errors} invalid provider catalog entries, see the logs")
+            )
+
         event.add_status(ActiveStatus("The OIDC provider is ready"))
 
     def _on_get_redirect_uri(self, event: ActionEvent) -> None:
-        if not (redirect_uri := self.external_idp_provider.get_redirect_uri()):
+        if not (redirect_uri := self._get_redirect_uri(event.params.get("provider-id"))):
             event.fail("No redirect uri is found")
             return
 
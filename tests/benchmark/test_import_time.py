@@ -0,0 +1,55 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[2]
+SAMPLES = 5
+
+# The dependencies are imported first, so that only the charm and the library are timed
+IMPORT_CHARM = """
+import json, time
+import ops, pydantic
+
+start = time.perf_counter()
+import charm
+imported = time.perf_counter()
+built_on_import = charm.Providers.__pydantic_complete__
+charm.ExternalIdpProvider.validate_provider_config([{
+    "provider": "generic", "client_id": "id", "client_secret": "secret", "issuer_url": "url",
+}])
+validated = time.perf_counter()
+
+print(json.dumps({
+    "import": imported - start,
+    "first_validation": validated - imported,
+    "built_on_import": built_on_import,
+}))
+"""
+
+
+def run_sample(env: dict[str, str]) -> dict:
+    output = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_CHARM], cwd=ROOT, env=env, text=True
+    )
+    return json.loads(output)
+
+
+def test_charm_import_time() -> None:
+    env = {**os.environ, "PYTHONPATH": f"{ROOT / 'src'}:{ROOT / 'lib'}"}
+    samples = [run_sample(env) for _ in range(SAMPLES)]
+
+    import_time = statistics.median(sample["import"] for sample in samples)
+    validation_time = statistics.median(sample["first_validation"] for sample in samples)
+    print(
+        f"\ncharm import: {import_time * 1000:.1f}ms, "
+        f"first provider validation: {validation_time * 1000:.1f}ms"
+    )
+
+    # The validators are only built when a provider is first validated
+    assert not any(sample["built_on_import"] for sample in samples)
@@ -0,0 +1,60 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import timeit
+
+import jsonschema
+from charms.kratos_external_idp_integrator.v0.kratos_external_provider import (
+    PROVIDER_JSON_SCHEMA,
+    REQUIRER_JSON_SCHEMA,
+    _load_data,
+)
+
+NUMBER = 50
+
+PROVIDER_DATA = {
+    "providers": json.dumps([
+        {
+            "provider": "generic",
+            "client_id": "client_id",
+            "client_secret": "client_secret",
+            "issuer_url": "https://example.com",
+            "secret_backend": "relation",
+            "scope": "profile email",
+        }
+    ])
+}
+REQUIRER_DATA = {
+    "providers": json.dumps([
+        {"provider_id": "provider", "redirect_uri": "https://example.com/callback"}
+    ])
+}
+
+
+def load_data_uncached(data: dict, schema: dict) -> dict:
+    """The previous `_load_data`, which built the validator on every call."""
+    data = dict(data, providers=json.loads(data["providers"]))
+    jsonschema.validate(instance=data, schema=schema)
+    return data
+
+
+def per_relation_time(load, data: dict, schema: dict) -> float:
+    return min(timeit.repeat(lambda: load(data, schema), number=NUMBER, repeat=5)) / NUMBER
+
+
+def test_v0_validation() -> None:
+    for name, data, schema in (
+        ("provider", PROVIDER_DATA, PROVIDER_JSON_SCHEMA),
+        ("requirer", REQUIRER_DATA, REQUIRER_JSON_SCHEMA),
+    ):
+        assert _load_data(data, schema) == load_data_uncached(data, schema)
+
+        before = per_relation_time(load_data_uncached, data, schema)
+        after = per_relation_time(_load_data, data, schema)
+        print(
+            f"\n{name} databag, per relation: {before * 1e6:.0f}us with jsonschema.validate, "
+            f"{after * 1e6:.0f}us with the cached validator"
+        )
+
+        assert after < before
@@ -3,15 +3,20 @@
 
 import dataclasses
 import json
+import os
 from textwrap import dedent
 from typing import Any
 from unittest.mock import MagicMock
 
 import pytest
-from ops.testing import Context, Relation, State
+from ops.testing import Context, Relation, Resource, State
 
+from catalog import CATALOG_RESOURCE
 from charm import KRATOS_EXTERNAL_IDP_INTEGRATION_NAME, KratosIdpIntegratorCharm
 
+# An empty resource stands for a detached catalog
+EMPTY_CATALOG = Resource(name=CATALOG_RESOURCE, path=os.devnull)
+
 
 @pytest.fixture
 def kratos_relation() -> Relation:
@@ -176,6 +181,9 @@ def jsonnet() -> str:
 
 
 def create_state(
-    config: dict[str, Any], relations: list[Relation] | None = None, leader: bool = True
+    config: dict[str, Any],
+    relations: list[Relation] | None = None,
+    leader: bool = True,
+    catalog: Resource = EMPTY_CATALOG,
 ) -> State:
-    return State(config=config, relations=relations or [], leader=leader)
+    return State(config=config, relations=relations or [], leader=leader, resources={catalog})
@@ -0,0 +1,118 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from charms.kratos_external_idp_integrator.v1.kratos_external_provider import Providers
+
+from catalog import catalog_digest, load_catalog
+
+
+@pytest.fixture
+def entries() -> list[dict[str, Any]]:
+    return [
+        {
+            "provider": "generic",
+            "client_id": "generic_client_id",
+            "client_secret": "client_secret",
+            "issuer_url": "http://example.com",
+        },
+        {
+            "provider": "github",
+            "client_id": "github_client_id",
+            "client_secret": "client_secret",
+            "secret_backend": "secret",
+        },
+    ]
+
+
+def write_json_lines(path: Path, entries: list[Any]) -> Path:
+    path.write_text("\n".join(json.dumps(entry) for entry in entries) + "\n")
+    return path
+
+
+class TestLoadCatalog:
+    def test_json_lines(self, tmp_path: Path, entries: list[dict[str, Any]]) -> None:
+        path = write_json_lines(tmp_path / "providers", entries)
+
+        catalog = load_catalog(path)
+
+        assert catalog.errors == []
+        assert catalog.digest == catalog_digest(path)
+        assert [e["provider"] for e in catalog.entries] == ["generic", "github"]
+        assert catalog.ids == [p.id for p in Providers.model_validate(entries)]
+
+    def test_yaml(self, tmp_path: Path, entries: list[dict[str, Any]]) -> None:
+        path = tmp_path / "providers"
+        path.write_text(
+            "- provider: generic\n"
+            "  client_id: generic_client_id\n"
+            "  client_secret: client_secret\n"
+            "  issuer_url: http://example.com\n"
+            "---\n"
+            "provider: github\n"
+            "client_id: github_client_id\n"
+            "client_secret: client_secret\n"
+            "secret_backend: secret\n"
+        )
+
+        catalog = load_catalog(path)
+
+        assert catalog.errors == []
+        assert catalog.ids == load_catalog(write_json_lines(tmp_path / "jsonl", entries)).ids
+
+    def test_entries_keep_the_secret_backend_only_if_set(
+        self, tmp_path: Path, entries: list[dict[str, Any]]
+    ) -> None:
+        catalog = load_catalog(write_json_lines(tmp_path / "providers", entries))
+
+        assert "secret_backend" not in catalog.entries[0]
+        assert catalog.entries[1]["secret_backend"] == "secret"
+
+    def test_invalid_entries_are_collected(
+        self, tmp_path: Path, entries: list[dict[str, Any]]
+    ) -> None:
+        path = tmp_path / "providers"
+        path.write_text(
+            "\n".join([
+                json.dumps(entries[0]),
+                "{not json",
+                json.dumps({"provider": "generic", "client_id": "id", "client_secret": "s"}),
+                json.dumps(["generic"]),
+                json.dumps(entries[0]),
+                json.dumps(entries[1]),
+            ])
+        )
+
+        catalog = load_catalog(path)
+
+        assert [e["provider"] for e in catalog.entries] == ["generic", "github"]
+        assert [error.split(":")[0] for error in catalog.errors] == [
+            "line 2",
+            "line 3",
+            "line 4",
+            "line 5",
+        ]
+        assert "generic.issuer_url: Field required" in catalog.errors[1]
+        assert "duplicate provider id" in catalog.errors[3]
+
+    def test_invalid_yaml_keeps_the_previous_entries(
+        self, tmp_path: Path, entries: list[dict[str, Any]]
+    ) -> None:
+        path = tmp_path / "providers"
+        path.write_text(
+            "provider: github\n"
+            "client_id: github_client_id\n"
+            "client_secret: client_secret\n"
+            "---\n"
+            "provider: [generic\n"
+        )
+
+        catalog = load_catalog(path)
+
+        assert [e["provider"] for e in catalog.entries] == ["github"]
+        assert len(catalog.errors) == 1
+        assert catalog.errors[0].startswith("entry 2: invalid YAML")
@@ -4,14 +4,31 @@
 import base64
 import dataclasses
 import json
+import zlib
+from pathlib import Path
 from typing import Any
 
+import ops
 import pytest
-from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
-from ops.testing import ActionFailed, Context, Relation
+from charms.kratos_external_idp_integrator.v1.kratos_external_provider import (
+    COMPACT_MAPPERS,
+    JUJU_SECRETS,
+    SUPPORTED_FEATURES,
+    ZLIB_BASE64,
+    ZLIB_ENCODING,
+    ExternalIdpProvider,
+    RedirectURIChangedEvent,
+    RelationReadyEvent,
+    RequirerProviders,
+)
+from ops.model import ActiveStatus, BlockedStatus, RelationDataContent, WaitingStatus
+from ops.testing import ActionFailed, Context, Relation, Resource
+from pytest_mock import MockerFixture
 from unit.conftest import create_state
 from utils import parse_databag
 
+import charm
+from catalog import CATALOG_RESOURCE
 from charm import KRATOS_EXTERNAL_IDP_INTEGRATION_NAME
 
 
@@ -68,6 +85,90 @@ class TestCharmConfig:
         assert relations[0].local_app_data
         assert parse_databag(relations[0].local_app_data) == generic_databag_v1
 
+    def test_jsonnet_config_with_compact_mappers(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        jsonnet: str,
+        kratos_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        new_config: dict[str, Any] = dict(jsonnet_mapper=jsonnet, **config)
+        relation = dataclasses.replace(
+            kratos_relation, remote_app_data={"features": json.dumps([COMPACT_MAPPERS])}
+        )
+        state = create_state(config=new_config, relations=[relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        data = parse_databag(list(state_out.relations)[0].local_app_data)
+        ref = data["providers"][0].pop("jsonnet_mapper_ref")
+        assert json.loads(data["mappers"]) == {ref: jsonnet}
+        del generic_databag_v1["providers"][0]["jsonnet_mapper"]
+        del generic_databag_v1["providers"][0]["mapper_url"]
+        assert data["providers"] == generic_databag_v1["providers"]
+
+    def test_providers_are_published_again_when_features_change(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        jsonnet: str,
+        kratos_relation: Relation,
+    ) -> None:
+        new_config: dict[str, Any] = dict(jsonnet_mapper=jsonnet, **config)
+        state = create_state(config=new_config, relations=[kratos_relation])
+        state_out = context.run(context.on.config_changed(), state)
+        full = list(state_out.relations)[0]
+        assert "mappers" not in full.local_app_data
+
+        relation = dataclasses.replace(
+            full, remote_app_data={"features": json.dumps([COMPACT_MAPPERS])}
+        )
+        state_out = context.run(
+            context.on.relation_changed(relation),
+            dataclasses.replace(state_out, relations=[relation]),
+        )
+
+        compact = state_out.get_relation(relation.id).local_app_data
+        assert "mappers" in compact
+        assert len(compact["providers"]) < len(full.local_app_data["providers"])
+
+    def test_large_providers_are_compressed(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        jsonnet: str,
+        kratos_relation: Relation,
+    ) -> None:
+        new_config: dict[str, Any] = dict(jsonnet_mapper=jsonnet * 20, **config)
+        relation = dataclasses.replace(
+            kratos_relation, remote_app_data={"features": json.dumps([ZLIB_ENCODING])}
+        )
+        state = create_state(config=new_config, relations=[relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        data = list(state_out.relations)[0].local_app_data
+        assert data["encoding"] == ZLIB_BASE64
+        providers = json.loads(zlib.decompress(base64.b64decode(data["providers"])))
+        assert providers[0]["jsonnet_mapper"] == jsonnet * 20
+
+    def test_small_providers_are_not_compressed(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        relation = dataclasses.replace(
+            kratos_relation, remote_app_data={"features": json.dumps([ZLIB_ENCODING])}
+        )
+        state = create_state(config=config, relations=[relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        assert parse_databag(list(state_out.relations)[0].local_app_data) == generic_databag_v1
+
     def test_extra_config(
         self,
         context: Context,
@@ -87,6 +188,144 @@ class TestCharmConfig:
         state_status = context.run(context.on.collect_unit_status(), state_out)
         assert state_status.unit_status == ActiveStatus("The OIDC provider is ready")
 
+    def test_unchanged_providers_are_not_written(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation_with_data: Relation,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation_with_data])
+        state_out = context.run(context.on.config_changed(), state)
+
+        spy = mocker.spy(RelationDataContent, "update")
+        state_out = context.run(context.on.config_changed(), state_out)
+
+        assert spy.call_count == 0
+
+        changed_config = dict(config, label="Another Provider")
+        context.run(
+            context.on.config_changed(), dataclasses.replace(state_out, config=changed_config)
+        )
+
+        assert spy.call_count == 1
+
+    def test_inputs_are_computed_once_per_dispatch(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation_with_data: Relation,
+    ) -> None:
+        validate_spy = mocker.spy(ExternalIdpProvider, "validate_provider_config")
+        parse_spy = mocker.spy(RequirerProviders, "model_validate_json")
+        state = create_state(config=config, relations=[kratos_relation_with_data])
+
+        state_out = context.run(context.on.relation_changed(kratos_relation_with_data), state)
+
+        assert validate_spy.call_count == 1
+        assert parse_spy.call_count == 1
+        assert state_out.unit_status == ActiveStatus("The OIDC provider is ready")
+
+    def test_status_does_not_validate_the_reconciled_config(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation], leader=False)
+        state_out = context.run(context.on.config_changed(), state)
+
+        validate_spy = mocker.spy(ExternalIdpProvider, "validate_provider_config")
+        state_out = context.run(context.on.update_status(), state_out)
+
+        assert validate_spy.call_count == 0
+        assert state_out.unit_status == WaitingStatus(
+            "Waiting for the requirer charm to register the OIDC provider"
+        )
+
+    def test_unchanged_inputs_skip_reconciliation(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation_with_data: Relation,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation_with_data])
+        state_out = context.run(context.on.config_changed(), state)
+
+        spy = mocker.spy(ExternalIdpProvider, "create_providers")
+        state_out = context.run(context.on.config_changed(), state_out)
+        assert spy.call_count == 0
+
+        state_out = context.run(context.on.upgrade_charm(), state_out)
+        state_out = context.run(context.on.config_changed(), state_out)
+        assert spy.call_count == 1
+
+        state_out = context.run(
+            context.on.config_changed(), dataclasses.replace(state_out, leader=False)
+        )
+        assert spy.call_count == 2
+
+    def test_ready_is_emitted_once_per_relation(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+    ) -> None:
+        relation = dataclasses.replace(kratos_relation, remote_units_data={0: {}, 1: {}})
+        state = create_state(config=config, relations=[relation])
+
+        state_out = context.run(context.on.relation_joined(relation, remote_unit=0), state)
+        relation = state_out.get_relation(relation.id)
+        state_out = context.run(context.on.relation_joined(relation, remote_unit=1), state_out)
+
+        ready_events = [e for e in context.emitted_events if isinstance(e, RelationReadyEvent)]
+        assert len(ready_events) == 1
+
+        relation = state_out.get_relation(relation.id)
+        state_out = context.run(context.on.relation_broken(relation), state_out)
+        state_out = dataclasses.replace(state_out, relations=[relation])
+        context.run(context.on.relation_joined(relation, remote_unit=0), state_out)
+
+        ready_events = [e for e in context.emitted_events if isinstance(e, RelationReadyEvent)]
+        assert len(ready_events) == 2
+
+    def test_redirect_uri_changed_is_emitted_on_transitions(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        kratos_relation_with_data: Relation,
+    ) -> None:
+        relation = dataclasses.replace(kratos_relation_with_data, remote_units_data={0: {}, 1: {}})
+        state = create_state(config=config, relations=[relation])
+
+        state_out = context.run(context.on.relation_changed(relation), state)
+        state_out = context.run(context.on.relation_changed(relation), state_out)
+
+        one_unit_left = dataclasses.replace(relation, remote_units_data={1: {}})
+        state_out = dataclasses.replace(state_out, relations=[one_unit_left])
+        state_out = context.run(
+            context.on.relation_departed(one_unit_left, remote_unit=0, departing_unit=0),
+            state_out,
+        )
+
+        no_unit_left = dataclasses.replace(relation, remote_units_data={})
+        state_out = dataclasses.replace(state_out, relations=[no_unit_left])
+        state_out = context.run(
+            context.on.relation_departed(no_unit_left, remote_unit=1, departing_unit=1),
+            state_out,
+        )
+        context.run(context.on.relation_broken(no_unit_left), state_out)
+
+        redirect_uris = [
+            e.redirect_uri
+            for e in context.emitted_events
+            if isinstance(e, RedirectURIChangedEvent)
+        ]
+        assert redirect_uris == ["https://example.com/callback", ""]
+
     def test_config_no_relation(self, context: Context, config: dict[str, Any]) -> None:
         state = create_state(config=config)
 
@@ -288,6 +527,437 @@ class TestProviderConfig:
         )
 
 
+class TestSecretBackend:
+    @pytest.fixture
+    def secret_config(self, config: dict[str, Any]) -> dict[str, Any]:
+        return dict(config, secret_backend="secret")
+
+    @pytest.fixture
+    def secrets_relation(self, kratos_relation: Relation) -> Relation:
+        return dataclasses.replace(
+            kratos_relation, remote_app_data={"features": json.dumps([JUJU_SECRETS])}
+        )
+
+    def test_credentials_are_published_in_a_secret(
+        self,
+        context: Context,
+        secret_config: dict[str, Any],
+        secrets_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        state = create_state(config=secret_config, relations=[secrets_relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        [secret] = state_out.secrets
+        assert secret.tracked_content == {"client-secret": secret_config["client_secret"]}
+        assert secret.remote_grants == {secrets_relation.id: {"kratos"}}
+
+        data = parse_databag(state_out.get_relation(secrets_relation.id).local_app_data)
+        provider = generic_databag_v1["providers"][0]
+        del provider["client_secret"]
+        assert data["providers"] == [provider]
+        assert json.loads(data["secrets"]) == {provider["id"]: {"id": secret.id, "revision": 1}}
+
+    def test_secret_revision_is_created_only_when_credentials_change(
+        self,
+        context: Context,
+        secret_config: dict[str, Any],
+        secrets_relation: Relation,
+    ) -> None:
+        state = create_state(config=secret_config, relations=[secrets_relation])
+        state_out = context.run(context.on.config_changed(), state)
+
+        relabeled = dataclasses.replace(state_out, config=dict(secret_config, label="Label"))
+        state_out = context.run(context.on.config_changed(), relabeled)
+        [secret] = state_out.secrets
+        assert secret.latest_content == {"client-secret": secret_config["client_secret"]}
+        providers_json = state_out.get_relation(secrets_relation.id).local_app_data["providers"]
+
+        rotated = dataclasses.replace(
+            state_out, config=dict(secret_config, label="Label", client_secret="rotated")
+        )
+        state_out = context.run(context.on.config_changed(), rotated)
+
+        [secret] = state_out.secrets
+        assert secret.latest_content == {"client-secret": "rotated"}
+        data = state_out.get_relation(secrets_relation.id).local_app_data
+        assert json.loads(data["secrets"])[json.loads(providers_json)[0]["id"]]["revision"] == 2
+        # Only the secret reference changed
+        assert data["providers"] == providers_json
+
+    def test_credentials_move_to_a_secret_when_the_requirer_supports_it(
+        self,
+        context: Context,
+        secret_config: dict[str, Any],
+        kratos_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        state = create_state(config=secret_config, relations=[kratos_relation])
+        state_out = context.run(context.on.config_changed(), state)
+        assert not state_out.secrets
+
+        relation = dataclasses.replace(
+            state_out.get_relation(kratos_relation.id),
+            remote_app_data={"features": json.dumps(sorted(SUPPORTED_FEATURES))},
+        )
+        state_out = context.run(
+            context.on.relation_changed(relation),
+            dataclasses.replace(state_out, relations=[relation]),
+        )
+        state_out = context.run(context.on.config_changed(), state_out)
+
+        [secret] = state_out.secrets
+        assert secret.latest_content == {"client-secret": secret_config["client_secret"]}
+        data = parse_databag(state_out.get_relation(relation.id).local_app_data)
+        provider = generic_databag_v1["providers"][0]
+        assert json.loads(data["secrets"]) == {provider["id"]: {"id": secret.id, "revision": 1}}
+        assert all("client_secret" not in entry for entry in data["providers"])
+
+    def test_secret_changed_by_another_leader_is_not_trusted(
+        self,
+        context: Context,
+        secret_config: dict[str, Any],
+        secrets_relation: Relation,
+    ) -> None:
+        rotated_config = dict(secret_config, client_secret="rotated")
+        state = create_state(config=secret_config, relations=[secrets_relation])
+        state_out = context.run(context.on.config_changed(), state)
+
+        # Another unit becomes the leader and rotates the credentials
+        other_unit = create_state(config=rotated_config, relations=list(state_out.relations))
+        other_unit = context.run(
+            context.on.config_changed(),
+            dataclasses.replace(other_unit, secrets=state_out.secrets),
+        )
+        state_out = context.run(
+            context.on.config_changed(),
+            dataclasses.replace(
+                state_out,
+                config=rotated_config,
+                leader=False,
+                relations=other_unit.relations,
+                secrets=other_unit.secrets,
+            ),
+        )
+
+        # The leadership comes back while the config has the previous credentials
+        state_out = context.run(
+            context.on.config_changed(),
+            dataclasses.replace(state_out, config=secret_config, leader=True),
+        )
+
+        [secret] = state_out.secrets
+        assert secret.latest_content == {"client-secret": secret_config["client_secret"]}
+        data = state_out.get_relation(secrets_relation.id).local_app_data
+        assert [ref["revision"] for ref in json.loads(data["secrets"]).values()] == [3]
+
+    def test_credentials_are_inline_if_secrets_are_not_supported(
+        self,
+        context: Context,
+        secret_config: dict[str, Any],
+        kratos_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        state = create_state(config=secret_config, relations=[kratos_relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        assert not state_out.secrets
+        assert (
+            parse_databag(state_out.get_relation(kratos_relation.id).local_app_data)
+            == generic_databag_v1
+        )
+
+    def test_secret_is_removed_when_provider_is_disabled(
+        self,
+        context: Context,
+        secret_config: dict[str, Any],
+        secrets_relation: Relation,
+    ) -> None:
+        state = create_state(config=secret_config, relations=[secrets_relation])
+        state_out = context.run(context.on.config_changed(), state)
+
+        disabled = dataclasses.replace(state_out, config=dict(secret_config, enabled=False))
+        state_out = context.run(context.on.config_changed(), disabled)
+
+        assert not state_out.secrets
+
+
+class TestMultipleProviders:
+    @pytest.fixture
+    def providers_config(self) -> dict[str, Any]:
+        return {
+            "secret_backend": "relation",
+            "providers": json.dumps([
+                {
+                    "provider": "generic",
+                    "client_id": "client_id",
+                    "client_secret": "client_secret",
+                    "issuer_url": "http://example.com",
+                },
+                {
+                    "provider": "github",
+                    "client_id": "github_client_id",
+                    "client_secret": "github_client_secret",
+                },
+            ]),
+        }
+
+    def test_all_providers_are_published(
+        self, context: Context, providers_config: dict[str, Any], kratos_relation: Relation
+    ) -> None:
+        state = create_state(config=providers_config, relations=[kratos_relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        providers = parse_databag(state_out.get_relation(kratos_relation.id).local_app_data)[
+            "providers"
+        ]
+        assert [p["provider"] for p in providers] == ["generic", "github"]
+        assert len({p["id"] for p in providers}) == 2
+
+    def test_invalid_providers_config(
+        self, context: Context, providers_config: dict[str, Any], kratos_relation: Relation
+    ) -> None:
+        providers_config["providers"] = "provider: generic"
+        state = create_state(config=providers_config, relations=[kratos_relation])
+
+        state_status = context.run(context.on.collect_unit_status(), state)
+
+        assert state_status.unit_status == BlockedStatus("Invalid OIDC provider configuration")
+
+    def test_duplicate_provider_ids(
+        self, context: Context, providers_config: dict[str, Any], kratos_relation: Relation
+    ) -> None:
+        google = {"provider": "google", "client_id": "client_id", "client_secret": "secret"}
+        providers_config["providers"] = json.dumps([google, dict(google, label="Google")])
+        state = create_state(config=providers_config, relations=[kratos_relation])
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        assert not state_out.get_relation(kratos_relation.id).local_app_data
+        assert state_out.unit_status == BlockedStatus("Invalid OIDC provider configuration")
+
+    def test_redirect_uris_are_matched_by_provider_id(
+        self, context: Context, providers_config: dict[str, Any], kratos_relation: Relation
+    ) -> None:
+        state = create_state(config=providers_config, relations=[kratos_relation])
+        state_out = context.run(context.on.config_changed(), state)
+        generic_id, github_id = (
+            p["id"]
+            for p in parse_databag(state_out.get_relation(kratos_relation.id).local_app_data)[
+                "providers"
+            ]
+        )
+
+        registered = [{"provider_id": github_id, "redirect_uri": "https://example.com/github"}]
+        relation = dataclasses.replace(
+            state_out.get_relation(kratos_relation.id),
+            remote_app_data={"providers": json.dumps(registered)},
+        )
+        state_out = dataclasses.replace(state_out, relations=[relation])
+        state_out = context.run(context.on.relation_changed(relation), state_out)
+
+        state_status = context.run(context.on.collect_unit_status(), state_out)
+        assert state_status.unit_status == WaitingStatus(
+            "Waiting for the requirer charm to register the OIDC provider"
+        )
+
+        registered.append({"provider_id": generic_id, "redirect_uri": "https://example.com/oidc"})
+        relation = dataclasses.replace(
+            relation, remote_app_data={"providers": json.dumps(registered)}
+        )
+        state_out = dataclasses.replace(state_out, relations=[relation])
+        state_out = context.run(context.on.relation_changed(relation), state_out)
+
+        state_status = context.run(context.on.collect_unit_status(), state_out)
+        assert state_status.unit_status == ActiveStatus("The OIDC provider is ready")
+
+        changed = [
+            (e.provider_id, e.redirect_uri)
+            for e in context.emitted_events
+            if isinstance(e, RedirectURIChangedEvent)
+        ]
+        assert changed == [
+            (github_id, "https://example.com/github"),
+            (generic_id, "https://example.com/oidc"),
+        ]
+
+        context.run(
+            context.on.action("get-redirect-uri", params={"provider-id": generic_id}), state_out
+        )
+        assert context.action_results == {"redirect-uri": "https://example.com/oidc"}
+
+
+class TestProviderCatalog:
+    @pytest.fixture
+    def catalog(self, tmp_path: Path) -> Resource:
+        path = tmp_path / "providers"
+        path.write_text(
+            "\n".join(
+                json.dumps(entry)
+                for entry in [
+                    {
+                        "provider": "generic",
+                        "client_id": "client_id",
+                        "client_secret": "client_secret",
+                        "issuer_url": "http://example.com",
+                    },
+                    {"provider": "github", "client_id": "github_client_id"},
+                    {
+                        "provider": "github",
+                        "client_id": "github_client_id",
+                        "client_secret": "github_client_secret",
+                    },
+                ]
+            )
+        )
+        return Resource(name=CATALOG_RESOURCE, path=path)
+
+    def test_valid_entries_are_published(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        catalog: Resource,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation], catalog=catalog)
+
+        state_out = context.run(context.on.config_changed(), state)
+
+        providers = parse_databag(state_out.get_relation(kratos_relation.id).local_app_data)[
+            "providers"
+        ]
+        assert [p["provider"] for p in providers] == ["generic", "github"]
+        assert providers[0]["client_id"] == "client_id"
+        assert providers[1]["client_secret"] == "github_client_secret"
+
+    def test_unchanged_catalog_is_not_validated_again(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        catalog: Resource,
+    ) -> None:
+        spy = mocker.spy(charm, "load_catalog")
+        state = create_state(config=config, relations=[kratos_relation], catalog=catalog)
+
+        state_out = context.run(context.on.config_changed(), state)
+        state_out = context.run(context.on.update_status(), state_out)
+        assert spy.call_count == 1
+
+        Path(catalog.path).write_text(Path(catalog.path).read_text().rsplit("\n", 1)[0])
+        state_out = context.run(context.on.config_changed(), state_out)
+        assert spy.call_count == 2
+
+        providers = parse_databag(state_out.get_relation(kratos_relation.id).local_app_data)[
+            "providers"
+        ]
+        assert [p["provider"] for p in providers] == ["generic"]
+
+    def test_catalog_is_only_loaded_again_on_upgrade_if_its_format_changed(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        catalog: Resource,
+    ) -> None:
+        spy = mocker.spy(charm, "load_catalog")
+        state = create_state(config=config, relations=[kratos_relation], catalog=catalog)
+        state_out = context.run(context.on.config_changed(), state)
+
+        state_out = context.run(context.on.upgrade_charm(), state_out)
+        assert spy.call_count == 1
+
+        mocker.patch.object(charm, "CATALOG_FORMAT", charm.CATALOG_FORMAT + 1)
+        context.run(context.on.upgrade_charm(), state_out)
+        assert spy.call_count == 2
+
+    def test_resource_is_only_checked_on_config_changed(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        catalog: Resource,
+    ) -> None:
+        spy = mocker.spy(ops.model.Resources, "fetch")
+        state = create_state(config=config, relations=[kratos_relation], catalog=catalog)
+        state_out = context.run(context.on.config_changed(), state)
+        assert spy.call_count == 1
+
+        state_out = context.run(context.on.update_status(), state_out)
+
+        assert spy.call_count == 1
+        assert state_out.unit_status == WaitingStatus(
+            "Waiting for the requirer charm to register the OIDC provider"
+        )
+
+    def test_cached_entries_are_not_validated_again(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        catalog: Resource,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation], catalog=catalog)
+        state_out = context.run(context.on.config_changed(), state)
+        local_app_data = state_out.get_relation(kratos_relation.id).local_app_data
+
+        relation = dataclasses.replace(
+            state_out.get_relation(kratos_relation.id),
+            remote_app_data={
+                "providers": json.dumps([
+                    {"provider_id": p["id"], "redirect_uri": f"https://example.com/{p['id']}"}
+                    for p in parse_databag(local_app_data)["providers"]
+                ])
+            },
+        )
+        spy = mocker.spy(charm.Providers, "model_validate")
+        state_out = context.run(
+            context.on.config_changed(), dataclasses.replace(state_out, relations=[relation])
+        )
+
+        assert spy.call_count == 0
+        assert state_out.get_relation(relation.id).local_app_data == local_app_data
+
+    def test_invalid_entries_are_reported(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        kratos_relation: Relation,
+        catalog: Resource,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation], catalog=catalog)
+        state_out = context.run(context.on.config_changed(), state)
+        ids = [
+            p["id"]
+            for p in parse_databag(state_out.get_relation(kratos_relation.id).local_app_data)[
+                "providers"
+            ]
+        ]
+
+        relation = dataclasses.replace(
+            state_out.get_relation(kratos_relation.id),
+            remote_app_data={
+                "providers": json.dumps([
+                    {"provider_id": id_, "redirect_uri": f"https://example.com/{id_}"}
+                    for id_ in ids
+                ])
+            },
+        )
+        state_out = dataclasses.replace(state_out, relations=[relation])
+        state_out = context.run(context.on.relation_changed(relation), state_out)
+
+        assert state_out.unit_status == ActiveStatus(
+            "1 invalid provider catalog entries, see the logs"
+        )
+
+
 class TestActions:
     def test_get_redirect_uri(
         self,
@@ -317,6 +987,21 @@ class TestActions:
 
         assert exc_info.value.message == "No redirect uri is found"
 
+    def test_get_redirect_uri_of_unknown_provider(
+        self,
+        context: Context,
+        config: dict[str, Any],
+        kratos_relation_with_data: Relation,
+    ) -> None:
+        state = create_state(config=config, relations=[kratos_relation_with_data])
+
+        with pytest.raises(ActionFailed) as exc_info:
+            context.run(
+                context.on.action("get-redirect-uri", params={"provider-id": "unknown"}), state
+            )
+
+        assert exc_info.value.message == "No redirect uri is found"
+
     def test_get_redirect_uri_without_relation_data(
         self, context: Context, config: dict[str, Any], kratos_relation: Relation
     ) -> None:
@@ -2,6 +2,7 @@
 # See LICENSE file for licensing details.
 
 import dataclasses
+import hashlib
 import json
 from typing import Any
 
@@ -9,9 +10,11 @@ import pytest
 import yaml
 from charms.kratos_external_idp_integrator.v0.kratos_external_provider import (
     ExternalIdpRequirer,
+    Provider,
 )
 from ops.charm import ActionEvent, CharmBase
 from ops.testing import Context, Relation, RelationBase, State
+from pytest_mock import MockerFixture
 
 EXTERNAL_IDP_RELATION = "kratos-external-idp"
 
@@ -77,7 +80,7 @@ class EndpointAggregatorCharm(CharmBase):
 
         providers_dicts = []
         for p in providers:
-            pd = {k: v for k, v in vars(p).items() if not k.startswith("_")}
+            pd = {k: v for k, v in dataclasses.asdict(p).items() if not k.startswith("_")}
             providers_dicts.append(pd)
 
         event.set_results({"providers": json.dumps(providers_dicts)})
@@ -247,3 +250,21 @@ class TestExternalIdpRequirer:
         relations_after = list(state_after_remove.relations)
         data = relations_after[0].local_app_data
         assert data == {}
+
+
+class TestProvider:
+    def test_provider_id(self, generic_databag: dict[str, Any], mocker: MockerFixture):
+        spy = mocker.spy(hashlib, "sha1")
+        provider = Provider.from_dict(dict(generic_databag["providers"][0]))
+
+        assert provider.provider_id == provider.provider_id
+        assert provider.provider_id.startswith("generic_")
+        assert spy.call_count == 1
+        assert not hasattr(provider, "__dict__")
+
+    def test_provider_id_is_overridden(self, generic_databag: dict[str, Any]):
+        provider = Provider.from_dict(dict(generic_databag["providers"][0], provider_id="id"))
+        assert provider.provider_id == "id"
+
+        provider.provider_id = "other"
+        assert provider.provider_id == provider.id == "other"
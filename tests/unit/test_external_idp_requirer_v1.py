@@ -0,0 +1,980 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+import json
+from typing import Any
+
+import charms.kratos_external_idp_integrator.v1.kratos_external_provider as external_provider
+import pytest
+import yaml
+from charms.kratos_external_idp_integrator.v1.kratos_external_provider import (
+    COMPACT_MAPPERS,
+    COSMETIC_CHANGE,
+    CREDENTIAL_CHANGE,
+    SUPPORTED_FEATURES,
+    ZLIB_BASE64,
+    ClientConfigChangedEvent,
+    ExternalIdpRequirer,
+    Providers,
+    ProvidersChangeset,
+    RequirerProvider,
+    RequirerProviders,
+)
+from ops.charm import CharmBase
+from ops.model import Model, ModelError
+from ops.testing import Context, Relation, RelationBase, Secret, State
+from pytest_mock import MockerFixture
+
+EXTERNAL_IDP_RELATION = "kratos-external-idp"
+
+KRATOS_META = f"""
+name: kratos-tester
+requires:
+  {EXTERNAL_IDP_RELATION}:
+    interface: external_provider
+"""
+
+
+class KratosTesterCharm(CharmBase):
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.external_idp_requirer = ExternalIdpRequirer(
+            self, relation_name=EXTERNAL_IDP_RELATION, persist_providers=True
+        )
+
+
+class CoalescingKratosTesterCharm(CharmBase):
+    applied: bool = True
+    changesets: list[ProvidersChangeset] = []
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.external_idp_requirer = ExternalIdpRequirer(
+            self,
+            relation_name=EXTERNAL_IDP_RELATION,
+            on_providers_changed=self._on_providers_changed,
+        )
+
+    def _on_providers_changed(self, changeset: ProvidersChangeset) -> bool:
+        self.changesets.append(changeset)
+        return self.applied
+
+
+class DualProtocolKratosTesterCharm(CharmBase):
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.external_idp_requirer = ExternalIdpRequirer(
+            self, relation_name=EXTERNAL_IDP_RELATION, accept_v0_providers=True
+        )
+
+
+class UpgradableKratosTesterCharm(CharmBase):
+    accept_v0_providers: bool = False
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.external_idp_requirer = ExternalIdpRequirer(
+            self,
+            relation_name=EXTERNAL_IDP_RELATION,
+            persist_providers=True,
+            accept_v0_providers=self.accept_v0_providers,
+        )
+
+
+@pytest.fixture
+def context() -> Context:
+    return Context(KratosTesterCharm, meta=yaml.safe_load(KRATOS_META))
+
+
+@pytest.fixture
+def dual_protocol_context() -> Context:
+    return Context(DualProtocolKratosTesterCharm, meta=yaml.safe_load(KRATOS_META))
+
+
+@pytest.fixture
+def coalescing_context() -> Context:
+    CoalescingKratosTesterCharm.applied = True
+    CoalescingKratosTesterCharm.changesets = []
+    return Context(CoalescingKratosTesterCharm, meta=yaml.safe_load(KRATOS_META))
+
+
+@pytest.fixture
+def external_idp_relation() -> Relation:
+    return Relation(EXTERNAL_IDP_RELATION, remote_app_name="kratos-external-provider")
+
+
+@pytest.fixture
+def external_idp_relation_with_data(
+    external_idp_relation: Relation, generic_databag_v1: dict[str, Any]
+) -> Relation:
+    remote_data = {"providers": json.dumps(generic_databag_v1["providers"])}
+    return dataclasses.replace(external_idp_relation, remote_app_data=remote_data)
+
+
+def create_state(
+    relations: list[RelationBase] | None = None,
+    leader: bool = True,
+    secrets: list[Secret] | None = None,
+) -> State:
+    return State(relations=relations or [], leader=leader, secrets=secrets or [])
+
+
+class TestProvidersCache:
+    def test_get_providers_is_cached(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        spy = mocker.spy(Providers, "model_validate_json")
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        with context(context.on.update_status(), state) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            first = requirer.get_providers()
+            second = requirer.get_providers()
+
+        assert spy.call_count == 1
+        assert len(first) == 1
+        assert first[0] is second[0]
+        assert first[0].id == generic_databag_v1["providers"][0]["id"]
+        assert first[0].relation_id == external_idp_relation_with_data.id
+
+    def test_changed_data_is_validated_again(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        spy = mocker.spy(Providers, "model_validate_json")
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        provider = dict(generic_databag_v1["providers"][0], label="New Label")
+
+        with context(context.on.update_status(), state) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            requirer.get_providers()
+            providers = requirer._parse_providers(
+                external_idp_relation_with_data.id, {"providers": json.dumps([provider])}
+            )
+
+        assert spy.call_count == 2
+        assert providers[0].label == "New Label"
+
+    def test_persisted_providers_are_not_validated_again(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation_with_data: Relation,
+    ) -> None:
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        with context(context.on.update_status(), state) as mgr:
+            expected = mgr.charm.external_idp_requirer.get_providers()
+            state_out = mgr.run()
+
+        spy = mocker.spy(Providers, "model_validate_json")
+        with context(context.on.update_status(), state_out) as mgr:
+            providers = mgr.charm.external_idp_requirer.get_providers()
+
+        assert spy.call_count == 0
+        assert providers == expected
+        assert providers[0].client_secret.get_secret_value() == "client_secret"
+
+    def test_persisted_providers_are_dropped_on_relation_broken(
+        self,
+        context: Context,
+        external_idp_relation_with_data: Relation,
+    ) -> None:
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        with context(context.on.update_status(), state) as mgr:
+            mgr.charm.external_idp_requirer.get_providers()
+            state_out = mgr.run()
+
+        state_out = context.run(
+            context.on.relation_broken(external_idp_relation_with_data), state_out
+        )
+
+        stored = state_out.get_stored_state(
+            "_stored", owner_path=f"KratosTesterCharm/ExternalIdpRequirer[{EXTERNAL_IDP_RELATION}]"
+        )
+        assert stored.content["providers"] == {}
+
+
+class TestPrefetch:
+    def test_remote_databags_are_loaded_once(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        relations = []
+        for i in range(5):
+            provider = dict(generic_databag_v1["providers"][0], id=f"provider-{i}")
+            relations.append(
+                Relation(
+                    EXTERNAL_IDP_RELATION,
+                    remote_app_name=f"integrator-{i}",
+                    remote_app_data={"providers": json.dumps([provider])},
+                )
+            )
+        state = create_state(relations=relations)
+
+        with context(context.on.update_status(), state) as mgr:
+            spy = mocker.spy(mgr.charm.model._backend, "relation_get")
+            providers = mgr.charm.external_idp_requirer.get_providers()
+
+        assert spy.call_count == len(relations)
+        assert {(provider.id, provider.relation_id) for provider in providers} == {
+            (f"provider-{i}", relation.id) for i, relation in enumerate(relations)
+        }
+
+    def test_relations_are_prefetched_once_per_dispatch(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        relations = [
+            Relation(
+                EXTERNAL_IDP_RELATION,
+                remote_app_name=f"integrator-{i}",
+                remote_app_data={
+                    "providers": json.dumps([
+                        dict(generic_databag_v1["providers"][0], id=f"provider-{i}")
+                    ])
+                },
+            )
+            for i in range(3)
+        ]
+        state = create_state(relations=relations)
+        executor = mocker.patch.object(
+            external_provider,
+            "ThreadPoolExecutor",
+            wraps=external_provider.ThreadPoolExecutor,
+        )
+
+        with context(context.on.update_status(), state) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            requirer.get_providers()
+            requirer.get_providers_index()
+            requirer.render_kratos_providers()
+
+        executor.assert_called_once()
+
+
+class TestQuarantine:
+    def test_invalid_relation_is_quarantined(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation_with_data: Relation,
+    ) -> None:
+        invalid_relation = Relation(
+            EXTERNAL_IDP_RELATION,
+            remote_app_name="invalid-integrator",
+            remote_app_data={"providers": json.dumps([{"provider": "generic"}])},
+        )
+        state = create_state(relations=[external_idp_relation_with_data, invalid_relation])
+
+        state_out = context.run(context.on.relation_changed(invalid_relation), state)
+        assert not any(isinstance(e, ClientConfigChangedEvent) for e in context.emitted_events)
+
+        spy = mocker.spy(Providers, "model_validate_json")
+        with context(context.on.update_status(), state_out) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            providers = requirer.get_providers()
+            quarantined = requirer.quarantined_relations
+
+        assert spy.call_count == 1
+        assert [p.relation_id for p in providers] == [external_idp_relation_with_data.id]
+        assert list(quarantined) == [invalid_relation.id]
+        assert "client_id" in quarantined[invalid_relation.id]
+
+    def test_quarantine_is_lifted_when_data_is_fixed(
+        self,
+        context: Context,
+        external_idp_relation_with_data: Relation,
+    ) -> None:
+        invalid_relation = dataclasses.replace(
+            external_idp_relation_with_data, remote_app_data={"providers": "not json"}
+        )
+        state_out = context.run(
+            context.on.relation_changed(invalid_relation),
+            create_state(relations=[invalid_relation]),
+        )
+
+        state_out = context.run(
+            context.on.relation_changed(external_idp_relation_with_data),
+            dataclasses.replace(state_out, relations=[external_idp_relation_with_data]),
+        )
+
+        with context(context.on.update_status(), state_out) as mgr:
+            assert mgr.charm.external_idp_requirer.quarantined_relations == {}
+        assert any(isinstance(e, ClientConfigChangedEvent) for e in context.emitted_events)
+
+
+class TestCompactMappers:
+    def test_features_are_advertised(
+        self, context: Context, external_idp_relation: Relation
+    ) -> None:
+        state = create_state(relations=[external_idp_relation])
+
+        state_out = context.run(context.on.relation_created(external_idp_relation), state)
+
+        local_app_data = state_out.get_relation(external_idp_relation.id).local_app_data
+        assert COMPACT_MAPPERS in json.loads(local_app_data["features"])
+
+    def test_features_are_kept_when_provider_is_removed(
+        self, context: Context, external_idp_relation: Relation
+    ) -> None:
+        relation = dataclasses.replace(
+            external_idp_relation,
+            local_app_data={"providers": "[]", "features": json.dumps([COMPACT_MAPPERS])},
+        )
+        state = create_state(relations=[relation])
+
+        with context(context.on.update_status(), state) as mgr:
+            mgr.charm.external_idp_requirer.remove_registered_provider(relation.id)
+            state_out = mgr.run()
+
+        assert state_out.get_relation(relation.id).local_app_data == {
+            "features": json.dumps([COMPACT_MAPPERS])
+        }
+
+    def test_mapper_references_are_resolved(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+        jsonnet: str,
+    ) -> None:
+        provider = dict(generic_databag_v1["providers"][0], mapper_url=None, jsonnet_mapper=None)
+        providers = [
+            dict(provider, id=f"provider-{i}", jsonnet_mapper_ref="ref") for i in range(2)
+        ]
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={
+                "providers": json.dumps(providers),
+                "mappers": json.dumps({"ref": jsonnet}),
+            },
+        )
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            decoded = mgr.charm.external_idp_requirer.get_providers()
+
+        expected = Providers.model_validate([
+            dict(provider, id=f"provider-{i}", jsonnet_mapper=jsonnet) for i in range(2)
+        ])
+        assert [p.model_dump() for p in decoded] == [p.model_dump() for p in expected]
+        assert decoded[0].mapper_url.startswith("base64://")
+
+    def test_unknown_mapper_reference_is_quarantined(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = dict(generic_databag_v1["providers"][0], jsonnet_mapper_ref="unknown")
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={"providers": json.dumps([provider]), "mappers": "{}"},
+        )
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            assert requirer.get_providers() == []
+            assert "unknown" in requirer.quarantined_relations[relation.id]
+
+    def test_invalid_mapper_reference_is_quarantined(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = dict(generic_databag_v1["providers"][0], jsonnet_mapper_ref=[1])
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={"providers": json.dumps([provider]), "mappers": "{}"},
+        )
+
+        with context(
+            context.on.relation_changed(relation), create_state(relations=[relation])
+        ) as mgr:
+            mgr.run()
+            quarantined = mgr.charm.external_idp_requirer.quarantined_relations
+
+        assert "Invalid jsonnet mapper reference" in quarantined[relation.id]
+
+
+class TestCompression:
+    def test_compressed_providers_are_decoded(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+        jsonnet: str,
+    ) -> None:
+        expected = Providers.model_validate([
+            dict(generic_databag_v1["providers"][0], jsonnet_mapper=jsonnet * 20, mapper_url=None)
+        ])
+        data = external_provider._encode_providers(expected, frozenset(SUPPORTED_FEATURES))
+        relation = dataclasses.replace(external_idp_relation, remote_app_data=data)
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            providers = mgr.charm.external_idp_requirer.get_providers()
+
+        assert data["encoding"] == ZLIB_BASE64
+        assert [p.model_dump() for p in providers] == [p.model_dump() for p in expected]
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            {"providers": "not base64", "encoding": ZLIB_BASE64},
+            {"providers": "bm90IHpsaWI=", "encoding": ZLIB_BASE64},
+            {"providers": "[]", "encoding": "unknown"},
+        ],
+    )
+    def test_invalid_encoding_is_quarantined(
+        self, context: Context, external_idp_relation: Relation, data: dict[str, str]
+    ) -> None:
+        relation = dataclasses.replace(external_idp_relation, remote_app_data=data)
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            assert requirer.get_providers() == []
+            assert list(requirer.quarantined_relations) == [relation.id]
+
+
+class TestJujuSecrets:
+    def test_credentials_are_read_from_the_secret(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        secret = Secret({"client-secret": "client_secret"})
+        provider = dict(generic_databag_v1["providers"][0])
+        del provider["client_secret"]
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={
+                "providers": json.dumps([provider]),
+                "secrets": json.dumps({provider["id"]: {"id": secret.id, "revision": 1}}),
+            },
+        )
+        state = create_state(relations=[relation], secrets=[secret])
+
+        with context(context.on.update_status(), state) as mgr:
+            providers = mgr.charm.external_idp_requirer.get_providers()
+
+        expected = Providers.model_validate(generic_databag_v1["providers"])
+        assert [p.model_dump() for p in providers] == [p.model_dump() for p in expected]
+
+    def test_unknown_secret_is_quarantined(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = generic_databag_v1["providers"][0]
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={
+                "providers": json.dumps([provider]),
+                "secrets": json.dumps({provider["id"]: {"id": "secret:unknown", "revision": 1}}),
+            },
+        )
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            assert requirer.get_providers() == []
+            assert "secret:unknown" in requirer.quarantined_relations[relation.id]
+
+    def test_unreadable_secret_is_quarantined(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = generic_databag_v1["providers"][0]
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={
+                "providers": json.dumps([provider]),
+                "secrets": json.dumps({provider["id"]: {"id": "secret:denied", "revision": 1}}),
+            },
+        )
+        mocker.patch.object(Model, "get_secret", side_effect=ModelError("permission denied"))
+
+        with context(
+            context.on.relation_changed(relation), create_state(relations=[relation])
+        ) as mgr:
+            mgr.run()
+            quarantined = mgr.charm.external_idp_requirer.quarantined_relations
+
+        assert "permission denied" in quarantined[relation.id]
+
+    def test_invalid_provider_id_is_quarantined(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = dict(generic_databag_v1["providers"][0], id=["not", "hashable"])
+        relation = dataclasses.replace(
+            external_idp_relation,
+            remote_app_data={
+                "providers": json.dumps([provider]),
+                "secrets": json.dumps({"provider": {"id": "secret:unknown", "revision": 1}}),
+            },
+        )
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            assert requirer.get_providers() == []
+            assert "Invalid provider id" in requirer.quarantined_relations[relation.id]
+
+
+class TestSecretContentsCache:
+    @pytest.fixture
+    def secret(self) -> Secret:
+        return Secret({"client-secret": "client_secret"})
+
+    def create_relation(
+        self,
+        relation: Relation,
+        provider: dict[str, Any],
+        secret: Secret,
+        revision: int = 1,
+    ) -> Relation:
+        provider = dict(provider)
+        del provider["client_secret"]
+        return dataclasses.replace(
+            relation,
+            remote_app_data={
+                "providers": json.dumps([provider]),
+                "secrets": json.dumps({provider["id"]: {"id": secret.id, "revision": revision}}),
+            },
+        )
+
+    def test_secret_is_read_only_when_revision_changes(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+        secret: Secret,
+    ) -> None:
+        spy = mocker.spy(Model, "get_secret")
+        provider = generic_databag_v1["providers"][0]
+        relation = self.create_relation(external_idp_relation, provider, secret)
+        state = create_state(relations=[relation], secrets=[secret])
+        state_out = context.run(context.on.relation_changed(relation), state)
+
+        relabeled = self.create_relation(
+            external_idp_relation, dict(provider, label="Label"), secret
+        )
+        state_out = context.run(
+            context.on.relation_changed(relabeled),
+            dataclasses.replace(state_out, relations=[relabeled]),
+        )
+        assert spy.call_count == 1
+
+        revised = self.create_relation(
+            external_idp_relation, dict(provider, label="Label"), secret, revision=2
+        )
+        context.run(
+            context.on.relation_changed(revised),
+            dataclasses.replace(state_out, relations=[revised]),
+        )
+        assert spy.call_count == 2
+
+    def test_secret_changed_refreshes_the_providers(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+        secret: Secret,
+    ) -> None:
+        relation = self.create_relation(
+            external_idp_relation, generic_databag_v1["providers"][0], secret
+        )
+        state = create_state(relations=[relation], secrets=[secret])
+        state_out = context.run(context.on.relation_changed(relation), state)
+
+        rotated = dataclasses.replace(secret, latest_content={"client-secret": "rotated"})
+        context.run(
+            context.on.secret_changed(rotated),
+            dataclasses.replace(state_out, secrets=[rotated]),
+        )
+
+        event = [e for e in context.emitted_events if isinstance(e, ClientConfigChangedEvent)][-1]
+        assert event.changed_fields == ["client_secret"]
+        assert event.impact == CREDENTIAL_CHANGE
+
+
+class TestDualProtocol:
+    V0_PROVIDERS = [
+        {
+            "client_id": "client_id",
+            "provider": "microsoft",
+            "secret_backend": "relation",
+            "scope": "profile email",
+            "client_secret": "client_secret",
+            "tenant_id": "tenant_id",
+        },
+        {
+            "client_id": "client_id",
+            "provider": "apple",
+            "secret_backend": "relation",
+            "scope": "profile email address phone",
+            "team_id": "team_id",
+            "private_key_id": "private_key_id",
+            "private_key": "private_key",
+            "provider_id": "apple",
+        },
+    ]
+    V1_PROVIDERS = [
+        {
+            "client_id": "client_id",
+            "provider": "microsoft",
+            "scope": "profile email",
+            "client_secret": "client_secret",
+            "microsoft_tenant": "tenant_id",
+        },
+        {
+            "client_id": "client_id",
+            "provider": "apple",
+            "apple_team_id": "team_id",
+            "apple_private_key_id": "private_key_id",
+            "apple_private_key": "private_key",
+            "id": "apple",
+        },
+    ]
+
+    def test_v0_providers_are_converted(
+        self,
+        dual_protocol_context: Context,
+        mocker: MockerFixture,
+        external_idp_relation: Relation,
+    ) -> None:
+        spy = mocker.spy(json, "loads")
+        relation = dataclasses.replace(
+            external_idp_relation, remote_app_data={"providers": json.dumps(self.V0_PROVIDERS)}
+        )
+        state = create_state(relations=[relation])
+
+        with dual_protocol_context(dual_protocol_context.on.update_status(), state) as mgr:
+            providers = mgr.charm.external_idp_requirer.get_providers()
+
+        expected = Providers.model_validate(self.V1_PROVIDERS)
+        assert [p.model_dump() for p in providers] == [p.model_dump() for p in expected]
+        assert spy.call_count == 1
+
+    def test_v1_providers_are_decoded(
+        self,
+        dual_protocol_context: Context,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        with dual_protocol_context(dual_protocol_context.on.update_status(), state) as mgr:
+            providers = mgr.charm.external_idp_requirer.get_providers()
+
+        expected = Providers.model_validate(generic_databag_v1["providers"])
+        assert [p.model_dump() for p in providers] == [p.model_dump() for p in expected]
+
+    def test_v0_providers_are_quarantined_by_default(
+        self, context: Context, external_idp_relation: Relation
+    ) -> None:
+        relation = dataclasses.replace(
+            external_idp_relation, remote_app_data={"providers": json.dumps(self.V0_PROVIDERS)}
+        )
+
+        with context(context.on.update_status(), create_state(relations=[relation])) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            assert requirer.get_providers() == []
+            assert list(requirer.quarantined_relations) == [relation.id]
+
+    def test_quarantine_is_lifted_on_upgrade(self, external_idp_relation: Relation) -> None:
+        context = Context(UpgradableKratosTesterCharm, meta=yaml.safe_load(KRATOS_META))
+        relation = dataclasses.replace(
+            external_idp_relation, remote_app_data={"providers": json.dumps(self.V0_PROVIDERS)}
+        )
+        UpgradableKratosTesterCharm.accept_v0_providers = False
+        state_out = context.run(context.on.relation_changed(relation), create_state([relation]))
+
+        UpgradableKratosTesterCharm.accept_v0_providers = True
+        with context(context.on.upgrade_charm(), state_out) as mgr:
+            mgr.run()
+            requirer = mgr.charm.external_idp_requirer
+            providers = requirer.get_providers()
+            assert requirer.quarantined_relations == {}
+
+        assert [p.id for p in providers] == [
+            p.id for p in Providers.model_validate(self.V1_PROVIDERS)
+        ]
+
+
+class TestClientConfigChanged:
+    def test_field_level_diff(
+        self,
+        context: Context,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = generic_databag_v1["providers"][0]
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        state_out = context.run(
+            context.on.relation_changed(external_idp_relation_with_data), state
+        )
+        state_out = context.run(
+            context.on.relation_changed(external_idp_relation_with_data), state_out
+        )
+
+        for changes in ({"label": "New Label"}, {"client_secret": "rotated"}):
+            relation = dataclasses.replace(
+                external_idp_relation_with_data,
+                remote_app_data={"providers": json.dumps([dict(provider, **changes)])},
+            )
+            state_out = context.run(
+                context.on.relation_changed(relation),
+                dataclasses.replace(state_out, relations=[relation]),
+            )
+
+        events = [e for e in context.emitted_events if isinstance(e, ClientConfigChangedEvent)]
+        assert len(events) == 3
+        assert events[0].impact == CREDENTIAL_CHANGE
+        assert (events[1].changed_fields, events[1].impact) == (["label"], COSMETIC_CHANGE)
+        assert events[2].changed_fields == ["client_secret", "label"]
+        assert events[2].impact == CREDENTIAL_CHANGE
+
+    def test_every_changed_provider_is_reported(
+        self,
+        context: Context,
+        external_idp_relation: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = generic_databag_v1["providers"][0]
+        providers = [
+            dict(provider, id="first", client_id="first"),
+            dict(provider, id="second", client_id="second"),
+        ]
+        relation = dataclasses.replace(
+            external_idp_relation, remote_app_data={"providers": json.dumps(providers)}
+        )
+
+        context.run(context.on.relation_changed(relation), create_state(relations=[relation]))
+
+        events = [e for e in context.emitted_events if isinstance(e, ClientConfigChangedEvent)]
+        assert [e.provider_id for e in events] == ["first", "second"]
+
+
+class TestProvidersChangeset:
+    def test_changes_are_delivered_once_per_dispatch(
+        self,
+        coalescing_context: Context,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider_id = generic_databag_v1["providers"][0]["id"]
+        state = create_state(relations=[external_idp_relation_with_data])
+
+        state_out = coalescing_context.run(
+            coalescing_context.on.relation_changed(external_idp_relation_with_data), state
+        )
+        state_out = coalescing_context.run(
+            coalescing_context.on.relation_changed(external_idp_relation_with_data), state_out
+        )
+        coalescing_context.run(
+            coalescing_context.on.relation_broken(external_idp_relation_with_data), state_out
+        )
+
+        assert CoalescingKratosTesterCharm.changesets == [
+            ProvidersChangeset(added=[provider_id]),
+            ProvidersChangeset(removed=[provider_id]),
+        ]
+
+    def test_changes_not_applied_are_merged(
+        self,
+        coalescing_context: Context,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = generic_databag_v1["providers"][0]
+        other_relation = Relation(
+            EXTERNAL_IDP_RELATION,
+            remote_app_name="other-integrator",
+            remote_app_data={"providers": json.dumps([dict(provider, id="other")])},
+        )
+        state = create_state(relations=[external_idp_relation_with_data, other_relation])
+
+        CoalescingKratosTesterCharm.applied = False
+        state_out = coalescing_context.run(
+            coalescing_context.on.relation_changed(external_idp_relation_with_data), state
+        )
+
+        CoalescingKratosTesterCharm.applied = True
+        state_out = coalescing_context.run(
+            coalescing_context.on.relation_changed(other_relation), state_out
+        )
+        coalescing_context.run(coalescing_context.on.update_status(), state_out)
+
+        assert CoalescingKratosTesterCharm.changesets == [
+            ProvidersChangeset(added=[provider["id"]]),
+            ProvidersChangeset(added=sorted([provider["id"], "other"])),
+        ]
+
+
+class TestRenderKratosProviders:
+    def test_render_kratos_providers(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+        jsonnet: str,
+    ) -> None:
+        provider = dict(generic_databag_v1["providers"][0], jsonnet_mapper=jsonnet)
+        other_relation = Relation(
+            EXTERNAL_IDP_RELATION,
+            remote_app_name="other-integrator",
+            remote_app_data={"providers": json.dumps([dict(provider, id="a-provider")])},
+        )
+        state = create_state(relations=[external_idp_relation_with_data, other_relation])
+        spy = mocker.spy(external_provider, "render_kratos_provider")
+
+        with context(context.on.update_status(), state) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            config = requirer.render_kratos_providers()
+            config_again = requirer.render_kratos_providers()
+
+        assert spy.call_count == 2
+        assert config == config_again
+        assert [p["id"] for p in config.providers] == ["a-provider", provider["id"]]
+        assert config.providers[0] == {
+            "id": "a-provider",
+            "provider": "generic",
+            "client_id": provider["client_id"],
+            "client_secret": provider["client_secret"],
+            "issuer_url": provider["issuer_url"],
+            "label": provider["label"],
+            "scope": provider["scope"].split(),
+            "mapper_url": mocker.ANY,
+        }
+
+        state = create_state(relations=[other_relation, external_idp_relation_with_data])
+        with context(context.on.update_status(), state) as mgr:
+            assert mgr.charm.external_idp_requirer.render_kratos_providers() == config
+
+    def test_rendered_providers_are_persisted(
+        self,
+        context: Context,
+        mocker: MockerFixture,
+        external_idp_relation_with_data: Relation,
+    ) -> None:
+        state = create_state(relations=[external_idp_relation_with_data])
+        spy = mocker.spy(external_provider, "render_kratos_provider")
+
+        with context(context.on.update_status(), state) as mgr:
+            config = mgr.charm.external_idp_requirer.render_kratos_providers()
+            state_out = mgr.run()
+
+        with context(context.on.update_status(), state_out) as mgr:
+            config_again = mgr.charm.external_idp_requirer.render_kratos_providers()
+
+        assert spy.call_count == 1
+        assert config_again == config
+
+
+class TestProvidersIndex:
+    def test_providers_index(
+        self,
+        context: Context,
+        external_idp_relation_with_data: Relation,
+        generic_databag_v1: dict[str, Any],
+    ) -> None:
+        provider = generic_databag_v1["providers"][0]
+        duplicate_relation = dataclasses.replace(
+            external_idp_relation_with_data, id=100, remote_app_name="duplicate-integrator"
+        )
+        other_relation = Relation(
+            EXTERNAL_IDP_RELATION,
+            remote_app_name="other-integrator",
+            remote_app_data={
+                "providers": json.dumps([dict(provider, id="other", client_id="other-client")])
+            },
+        )
+        state = create_state(
+            relations=[external_idp_relation_with_data, duplicate_relation, other_relation]
+        )
+
+        with context(context.on.update_status(), state) as mgr:
+            requirer = mgr.charm.external_idp_requirer
+            index = requirer.get_providers_index()
+            assert requirer.get_providers_index() is index
+
+        assert len(index) == 2
+        assert index.get("other") is index.by_client[("generic", "other-client")]
+        assert index.get("missing") is None
+        assert [p.id for p in index.by_relation_id[other_relation.id]] == ["other"]
+        assert sorted(index.duplicates[provider["id"]]) == sorted([
+            external_idp_relation_with_data.id,
+            duplicate_relation.id,
+        ])
+
+
+class TestUpdateRegisteredProviders:
+    def test_update_registered_providers(self, context: Context) -> None:
+        relations = [
+            Relation(EXTERNAL_IDP_RELATION, remote_app_name=f"integrator-{i}") for i in range(3)
+        ]
+        registered = {
+            relation.id: RequirerProviders([
+                RequirerProvider(
+                    provider_id=f"provider-{relation.id}",
+                    redirect_uri=f"https://example.com/{relation.id}/callback",
+                )
+            ])
+            for relation in relations
+        }
+        state = create_state(relations=relations)
+
+        with context(context.on.update_status(), state) as mgr:
+            written = mgr.charm.external_idp_requirer.update_registered_providers(registered)
+            state_out = mgr.run()
+
+        assert written == 3
+        for relation in relations:
+            data = json.loads(state_out.get_relation(relation.id).local_app_data["providers"])
+            assert data == [registered[relation.id][0].model_dump()]
+
+        with context(context.on.update_status(), state_out) as mgr:
+            written = mgr.charm.external_idp_requirer.update_registered_providers(registered)
+
+        assert written == 0
+
+    def test_update_registered_providers_without_leadership(self, context: Context) -> None:
+        relation = Relation(EXTERNAL_IDP_RELATION, remote_app_name="integrator")
+        registered = {
+            relation.id: RequirerProviders([
+                RequirerProvider(provider_id="provider", redirect_uri="https://example.com")
+            ])
+        }
+        state = create_state(relations=[relation], leader=False)
+
+        with context(context.on.update_status(), state) as mgr:
+            written = mgr.charm.external_idp_requirer.update_registered_providers(registered)
+            state_out = mgr.run()
+
+        assert written == 0
+        assert state_out.get_relation(relation.id).local_app_data == {}